@@ -0,0 +1,60 @@
+""" Measure how Manifest lookups scale with the number of repos
+
+Usage:
+    python benchmarks/bench_manifest.py [NUM_REPOS ...]
+
+"""
+
+import sys
+import time
+from typing import Any, Callable, Dict, List  # noqa
+
+import tsrc.manifest
+
+GROUP_SIZE = 100
+
+
+def generate_config(num_repos: int) -> Dict[str, Any]:
+    repos = list()
+    for i in range(num_repos):
+        src = "repo-%05d" % i
+        repos.append({"src": src, "url": "git@example.com:%s.git" % src})
+    groups = dict()  # type: Dict[str, Any]
+    for start in range(0, num_repos, GROUP_SIZE):
+        name = "group-%05d" % start
+        group_repos = [repo["src"] for repo in repos[start:start + GROUP_SIZE]]
+        groups[name] = {"repos": group_repos}
+        if start:
+            # Each group includes the previous one
+            groups[name]["includes"] = ["group-%05d" % (start - GROUP_SIZE)]
+    return {"repos": repos, "groups": groups}
+
+
+def measure(name: str, func: Callable[[], Any]) -> None:
+    start = time.perf_counter()
+    func()
+    duration = time.perf_counter() - start
+    print("  {:<20} {:8.3f} ms".format(name, duration * 1000))
+
+
+def bench(num_repos: int) -> None:
+    print("%d repos" % num_repos)
+    config = generate_config(num_repos)
+    manifest = tsrc.manifest.Manifest()
+    measure("load", lambda: manifest.load(config))  # type: ignore
+    srcs = [repo["src"] for repo in config["repos"]]
+    measure("get_url (all)", lambda: [manifest.get_url(src) for src in srcs])
+    last_group = sorted(config["groups"])[-1]
+    measure("get_repos (groups)", lambda: manifest.get_repos(groups=[last_group]))
+    urls = [repo["url"] for repo in config["repos"]]
+    measure("get_repos_by_url", lambda: [manifest.get_repos_by_url(url) for url in urls])
+
+
+def main() -> None:
+    sizes = [int(x) for x in sys.argv[1:]] or [100, 1000, 10000]
+    for size in sizes:
+        bench(size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+""" Measure how tsrc commands scale with the number of repos
+
+Usage:
+    python benchmarks/bench_workspace.py [--sizes 10 100 1000] [--commits 10]
+                                         [--baseline FILE] [--save-baseline]
+
+For each size, a GitServer with that many repos is generated with
+`git fast-import`, then init, sync, status, foreach and log are run on
+a fresh workspace. Each command runs in its own process, so that its
+peak RSS can be measured. Only the git processes spawned through tsrc.git
+are counted, not the commands run by `tsrc foreach`.
+
+Results are compared with the ones stored in the baseline file, and the
+script exits with 1 if a command got slower by more than the tolerance,
+or started spawning more git processes. It also exits with 1 when there
+is nothing to compare with. Baselines depend on the machine, so none is
+committed: use --save-baseline to (re)write the baseline file.
+
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List  # noqa
+
+from path import Path
+
+import tsrc.cli.main
+import tsrc.git
+import tsrc.timings
+from tsrc.test.helpers.git_server import GitServer
+
+DEFAULT_BASELINE = Path(__file__).parent.joinpath("baselines.json")
+COMMANDS = [
+    ("init", ["init", "{manifest_url}"]),
+    ("sync", ["sync"]),
+    ("status", ["status"]),
+    ("foreach", ["foreach", "--", "git", "rev-parse", "HEAD"]),
+    ("log", ["log", "--from", "HEAD~1"]),
+]
+
+# Do not report slowdowns smaller than that, in seconds: they are
+# mostly noise when the commands run on small workspaces
+MIN_SLOWDOWN = 0.05
+
+Result = Dict[str, float]
+
+
+def generate_history(name: str, num_commits: int) -> bytes:
+    """ Return a fast-import stream creating `num_commits` commits
+    on master, each one changing one file
+
+    """
+    lines = list()  # type: List[str]
+    for i in range(num_commits):
+        contents = "%s: change %d\n" % (name, i)
+        message = "Change %d" % i
+        lines.extend([
+            "commit refs/heads/master",
+            "committer Bench <bench@example.com> %d +0000" % (1500000000 + i * 60),
+            "data %d" % len(message),
+            message,
+        ])
+        lines.extend([
+            "M 644 inline file-%d.txt" % (i % 10),
+            "data %d" % len(contents),
+            contents,
+        ])
+    return ("\n".join(lines) + "\n").encode()
+
+
+def add_repos(git_server: GitServer, num_repos: int, num_commits: int) -> None:
+    for i in range(num_repos):
+        name = "repo-%04d" % i
+        bare_path = git_server.bare_path.joinpath(name)
+        bare_path.makedirs_p()
+        tsrc.git.run_git(bare_path, "init", "--bare", "--quiet")
+        stream = generate_history(name, num_commits)
+        subprocess.run(["git", "fast-import", "--quiet"], cwd=bare_path,
+                       input=stream, check=True)
+        url = git_server.get_url(name)
+        git_server.manifest.data["repos"].append({"src": name, "url": url})
+    git_server.manifest.push(message="Add %d repos" % num_repos)
+
+
+def run_measured(result_path: Path, args: List[str]) -> None:
+    """ Run tsrc with `args` in this process, and write the results to
+    `result_path`
+
+    """
+    tsrc.timings.enable()
+    start = time.perf_counter()
+    rc = 0
+    try:
+        tsrc.cli.main.main(args=args)
+    except SystemExit as e:
+        rc = 1 if e.code else 0
+    wall_time = time.perf_counter() - start
+    num_git_calls = sum(s.num_git_calls for s in tsrc.timings.get_stats())
+    # ru_maxrss is in kilobytes on Linux
+    result = {
+        "wall_time": wall_time,
+        "git_calls": num_git_calls,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children_peak_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        "rc": rc,
+    }
+    result_path.write_text(json.dumps(result))
+
+
+def measure(workspace_path: Path, args: List[str]) -> Result:
+    with tempfile.NamedTemporaryFile(suffix=".json") as result_file:
+        cmd = [sys.executable, __file__, "--measure", result_file.name, "--", "-q"] + args
+        subprocess.run(cmd, cwd=workspace_path, check=True,
+                       stdout=subprocess.DEVNULL)
+        result = json.loads(Path(result_file.name).text())  # type: Result
+    if result.pop("rc"):
+        sys.exit("tsrc %s failed" % " ".join(args))
+    return result
+
+
+def bench(size: int, num_commits: int) -> Dict[str, Result]:
+    res = dict()  # type: Dict[str, Result]
+    with tempfile.TemporaryDirectory(prefix="tsrc-bench-") as tmp:
+        tmp_path = Path(tmp)
+        git_server = GitServer(tmp_path)
+        start = time.perf_counter()
+        add_repos(git_server, size, num_commits)
+        print("%d repos (generated in %.2fs)" % (size, time.perf_counter() - start))
+        workspace_path = tmp_path.joinpath("work")
+        workspace_path.makedirs_p()
+        for name, cmd in COMMANDS:
+            args = [x.format(manifest_url=git_server.manifest_url) for x in cmd]
+            result = measure(workspace_path, args)
+            res["%d/%s" % (size, name)] = result
+            print("  {:<8} {:8.3f} s {:6d} git calls {:8d} kB peak RSS".format(
+                name, result["wall_time"], int(result["git_calls"]),
+                int(result["peak_rss_kb"])))
+    return res
+
+
+def compare(results: Dict[str, Result], baseline: Dict[str, Result],
+            tolerance: float) -> List[str]:
+    """ Return a description of each regression """
+    res = list()
+    for key, result in sorted(results.items()):
+        expected = baseline.get(key)
+        if not expected:
+            continue
+        max_time = max(expected["wall_time"] * (1 + tolerance),
+                       expected["wall_time"] + MIN_SLOWDOWN)
+        if result["wall_time"] > max_time:
+            res.append("%s: %.3fs, was %.3fs" % (key, result["wall_time"],
+                                                 expected["wall_time"]))
+        if result["git_calls"] > expected["git_calls"]:
+            res.append("%s: %d git calls, was %d" % (key, int(result["git_calls"]),
+                                                     int(expected["git_calls"])))
+    return res
+
+
+def main() -> None:
+    if len(sys.argv) > 2 and sys.argv[1] == "--measure":
+        # Called by measure(): the tsrc args follow "--"
+        run_measured(Path(sys.argv[2]), sys.argv[4:])
+        return
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--commits", type=int, default=10,
+                        help="Number of commits in each repo")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown, relative to the baseline")
+    args = parser.parse_args()
+    if args.commits < 2:
+        parser.error("--commits must be at least 2, for `tsrc log --from HEAD~1`")
+    if not args.save_baseline and not args.baseline.exists():
+        sys.exit("No baseline in %s, nothing compared (use --save-baseline)" % args.baseline)
+
+    results = dict()  # type: Dict[str, Result]
+    for size in args.sizes:
+        results.update(bench(size, args.commits))
+
+    baseline = dict()  # type: Dict[str, Result]
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.text())
+    if args.save_baseline:
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print("Baseline written to", args.baseline)
+        return
+
+    if not any(key in baseline for key in results):
+        sys.exit("None of these sizes are in %s, nothing compared" % args.baseline)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("Regressions:")
+        for regression in regressions:
+            print("  " + regression)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
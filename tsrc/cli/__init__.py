@@ -1,13 +1,19 @@
 """ Common tools for tsrc commands """
 
 import argparse
+import json
 import os
+import sys
+import threading
+from typing import Any, Dict  # noqa
 
 from path import Path
 
 import tsrc
 import tsrc.workspace
 
+_JSON_LOCK = threading.Lock()
+
 
 def find_workspace_path() -> Path:
     """ Look for a workspace root somewhere in the upper directories
@@ -31,4 +37,15 @@ def get_workspace(args: argparse.Namespace) -> tsrc.workspace.Workspace:
         workspace_path = Path(args.workspace_path)
     else:
         workspace_path = find_workspace_path()
-    return tsrc.workspace.Workspace(workspace_path)
+    return tsrc.workspace.Workspace(workspace_path, num_jobs=args.num_jobs)
+
+
+def print_json(obj: Dict[str, Any]) -> None:
+    """ Write `obj` on one line of stdout, for --format=json
+
+    Safe to call from several threads: lines are never mixed.
+    """
+    line = json.dumps(obj) + "\n"
+    with _JSON_LOCK:
+        sys.stdout.write(line)
+        sys.stdout.flush()
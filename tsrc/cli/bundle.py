@@ -0,0 +1,49 @@
+""" Entry point for tsrc bundle """
+
+import argparse
+import os
+
+from path import Path
+import ui
+
+import tsrc
+import tsrc.cli
+import tsrc.executor
+import tsrc.git
+import tsrc.workspace
+
+
+class BundleCreator(tsrc.executor.Task[tsrc.Repo]):
+    def __init__(self, workspace: tsrc.workspace.Workspace, bundles_path: Path) -> None:
+        self.workspace = workspace
+        self.bundles_path = bundles_path
+
+    def description(self) -> str:
+        return "Creating bundles in %s" % self.bundles_path
+
+    def display_item(self, repo: tsrc.Repo) -> str:
+        return repo.src
+
+    def process(self, repo: tsrc.Repo) -> None:
+        ui.info(repo.src)
+        repo_path = self.workspace.joinpath(repo.src)
+        bundle_path = self.bundles_path.joinpath(repo.src + ".bundle")
+        bundle_path.parent.makedirs_p()
+        # Write next to the final location, then rename, so that an
+        # interrupted run never leaves a truncated bundle behind
+        tmp_path = bundle_path.parent.joinpath(bundle_path.name + ".tmp")
+        try:
+            tsrc.git.run_git(repo_path, "bundle", "create", tmp_path, "--all")
+            os.replace(tmp_path, bundle_path)
+        except (tsrc.Error, OSError):
+            tmp_path.remove_p()
+            raise tsrc.Error("Creating bundle failed")
+
+
+def main(args: argparse.Namespace) -> None:
+    workspace = tsrc.cli.get_workspace(args)
+    workspace.load_manifest()
+    bundles_path = Path(args.bundles_path).abspath()
+    bundle_creator = BundleCreator(workspace, bundles_path)
+    tsrc.executor.run_sequence(workspace.get_repos(), bundle_creator, num_jobs=workspace.num_jobs)
+    ui.info("Done", ui.check)
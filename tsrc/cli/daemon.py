@@ -0,0 +1,26 @@
+""" Entry point for tsrc daemon """
+
+import argparse
+import signal
+import types
+from typing import Optional
+
+import ui
+
+import tsrc.cli
+import tsrc.daemon
+
+
+def main(args: argparse.Namespace) -> None:
+    workspace = tsrc.cli.get_workspace(args)
+    daemon = tsrc.daemon.StatusDaemon(workspace)
+
+    def on_sigterm(signum: int, frame: Optional[types.FrameType]) -> None:
+        daemon.stop_requested = True
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    ui.info("Stopped", ui.check)
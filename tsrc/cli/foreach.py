@@ -1,8 +1,16 @@
 """ Entry point for tsrc foreach """
 
 import argparse
-from typing import List, TypeVar
+import collections
+import os
+import selectors
+import shutil
 import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple, TypeVar  # noqa
 
 from path import Path
 import ui
@@ -21,11 +29,20 @@ T = TypeVar('T')
 
 class CmdRunner(tsrc.executor.Task[tsrc.Repo]):
     def __init__(self, workspace: Path, cmd: List[str],
-                 cmd_as_str: str, shell: bool = False) -> None:
+                 cmd_as_str: str, shell: bool = False, buffered: bool = False,
+                 json_output: bool = False) -> None:
         self.workspace = workspace
         self.cmd = cmd
         self.cmd_as_str = cmd_as_str
         self.shell = shell
+        # When commands run in parallel, their output is captured, and
+        # displayed in one go once they are done, so that the outputs
+        # of different repos are not mixed
+        self.buffered = buffered
+        # With --format=json, the output is captured too, and written
+        # along with the return code and the duration of the command
+        self.json_output = json_output
+        self._output_lock = threading.Lock()
 
     def display_item(self, repo: tsrc.Repo) -> str:
         return repo.src
@@ -33,20 +50,176 @@ class CmdRunner(tsrc.executor.Task[tsrc.Repo]):
     def description(self) -> str:
         return "Running `%s` on every repo" % self.cmd_as_str
 
-    def process(self, repo: tsrc.Repo) -> None:
+    def capture_output(self) -> bool:
+        # Already done by run_buffered(), without keeping the output in memory
+        return False
+
+    def display_header(self, repo: tsrc.Repo) -> None:
         ui.info(repo.src, "\n",
                 ui.lightgray, "$ ",
                 ui.reset, ui.bold, self.cmd_as_str,
                 sep="")
+
+    def process(self, repo: tsrc.Repo) -> None:
         full_path = self.workspace.joinpath(repo.src)
-        rc = subprocess.call(self.cmd, cwd=full_path, shell=self.shell)
+        if self.json_output:
+            rc = self.run_json(repo, full_path)
+        elif self.buffered:
+            rc = self.run_buffered(repo, full_path)
+        else:
+            self.display_header(repo)
+            rc = subprocess.call(self.cmd, cwd=full_path, shell=self.shell)
         if rc != 0:
-            raise CommandFailed()
+            raise CommandFailed("command exited with code", rc)
+
+    def run_buffered(self, repo: tsrc.Repo, full_path: Path) -> int:
+        # Use a temporary file rather than a pipe, so that commands
+        # with a lot of output do not have to be kept in memory
+        with tempfile.TemporaryFile() as output:
+            rc = subprocess.call(self.cmd, cwd=full_path, shell=self.shell,
+                                 stdin=subprocess.DEVNULL,
+                                 stdout=output, stderr=subprocess.STDOUT)
+            output.seek(0)
+            with self._output_lock:
+                self.display_header(repo)
+                sys.stdout.flush()
+                shutil.copyfileobj(output, sys.stdout.buffer)
+                sys.stdout.buffer.flush()
+        return rc
+
+    def run_json(self, repo: tsrc.Repo, full_path: Path) -> int:
+        with tempfile.TemporaryFile() as output:
+            start = time.perf_counter()
+            rc = subprocess.call(self.cmd, cwd=full_path, shell=self.shell,
+                                 stdin=subprocess.DEVNULL,
+                                 stdout=output, stderr=subprocess.STDOUT)
+            duration = time.perf_counter() - start
+            output.seek(0)
+            text = output.read().decode("utf-8", errors="replace")
+        tsrc.cli.print_json({
+            "src": repo.src, "cmd": self.cmd_as_str, "rc": rc,
+            "duration": round(duration, 3), "output": text,
+        })
+        return rc
+
+
+class RunningCommand:
+    def __init__(self, repo: tsrc.Repo, process: "subprocess.Popen[bytes]", prefix: bytes) -> None:
+        self.repo = repo
+        self.process = process
+        assert process.stdout
+        self.stdout = process.stdout
+        self.prefix = prefix
+        self.pending = b""
+
+
+class PrefixedRunner:
+    """ Run the command on up to `num_jobs` repos at a time, and stream
+    their output line by line, each line prefixed with `[<repo.src>]`
+
+    The pipes of all the commands are read from the main thread,
+    using a selector, so no thread is needed for each command.
+    """
+    def __init__(self, cmd_runner: CmdRunner, num_jobs: int) -> None:
+        self.cmd_runner = cmd_runner
+        self.num_jobs = num_jobs
+        self.selector = selectors.DefaultSelector()
+        self.errors = list()  # type: List[Tuple[tsrc.Repo, tsrc.Error]]
+        self.num_done = 0
+
+    def run(self, repos: List[tsrc.Repo]) -> None:
+        if not repos:
+            return
+        ui.info_1(self.cmd_runner.description())
+        width = max(len(repo.src) for repo in repos) + 2
+        to_start = collections.deque(repos)
+        running = list()  # type: List[RunningCommand]
+        try:
+            while to_start or running:
+                while to_start and len(running) < self.num_jobs:
+                    repo = to_start.popleft()
+                    prefix = ("[%s]" % repo.src).ljust(width) + " "
+                    running.append(self.start(repo, prefix.encode()))
+                for key, _ in self.selector.select():
+                    command = key.data
+                    if not self.read_output(command):
+                        running.remove(command)
+                        self.finish(command, len(repos))
+        finally:
+            for command in running:
+                command.process.kill()
+                command.process.wait()
+            self.selector.close()
+        # Report errors in the order of the manifest, like the executor does
+        order = {repo.src: i for i, repo in enumerate(repos)}
+        self.errors.sort(key=lambda error: order[error[0].src])
+
+    def start(self, repo: tsrc.Repo, prefix: bytes) -> RunningCommand:
+        full_path = self.cmd_runner.workspace.joinpath(repo.src)
+        process = subprocess.Popen(self.cmd_runner.cmd, cwd=full_path,
+                                   shell=self.cmd_runner.shell,
+                                   stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        command = RunningCommand(repo, process, prefix)
+        self.selector.register(command.stdout, selectors.EVENT_READ, data=command)
+        return command
+
+    def read_output(self, command: RunningCommand) -> bool:
+        """ Write the complete lines the command has output so far.
+        Return False once the output is closed
+
+        """
+        chunk = os.read(command.stdout.fileno(), 65536)
+        if not chunk:
+            self.selector.unregister(command.stdout)
+            command.stdout.close()
+            if command.pending:
+                self.write_lines(command, [command.pending])
+            return False
+        *lines, command.pending = (command.pending + chunk).split(b"\n")
+        self.write_lines(command, lines)
+        return True
+
+    @staticmethod
+    def write_lines(command: RunningCommand, lines: List[bytes]) -> None:
+        if not lines:
+            return
+        sys.stdout.flush()
+        for line in lines:
+            sys.stdout.buffer.write(command.prefix + line + b"\n")
+        sys.stdout.buffer.flush()
+
+    def finish(self, command: RunningCommand, num_repos: int) -> None:
+        rc = command.process.wait()
+        ok = rc == 0
+        if not ok:
+            error = CommandFailed("command exited with code", rc)
+            self.errors.append((command.repo, error))
+        ui.info_count(self.num_done, num_repos, command.repo.src, ui.check if ok else ui.cross)
+        self.num_done += 1
 
 
 def main(args: argparse.Namespace) -> None:
     workspace = tsrc.cli.get_workspace(args)
     workspace.load_manifest()
-    cmd_runner = CmdRunner(workspace, args.cmd, args.cmd_as_str, shell=args.shell)
-    tsrc.executor.run_sequence(workspace.get_repos(), cmd_runner)
+    repos = workspace.get_repos()
+    json_output = args.output_format == "json"
+    if args.output == "prefix":
+        if json_output:
+            raise tsrc.Error("--output=prefix cannot be used with --format=json")
+        if os.name == "nt":
+            raise tsrc.Error("--output=prefix is not supported on Windows")
+        cmd_runner = CmdRunner(workspace, args.cmd, args.cmd_as_str, shell=args.shell)
+        prefixed_runner = PrefixedRunner(cmd_runner, workspace.num_jobs)
+        prefixed_runner.run(repos)
+        if prefixed_runner.errors:
+            # Display the errors like the executor does
+            executor = tsrc.executor.SequentialExecutor(cmd_runner)
+            executor.errors = prefixed_runner.errors
+            executor.handle_errors()
+    else:
+        buffered = workspace.num_jobs > 1
+        cmd_runner = CmdRunner(workspace, args.cmd, args.cmd_as_str,
+                               shell=args.shell, buffered=buffered, json_output=json_output)
+        tsrc.executor.run_sequence(repos, cmd_runner, num_jobs=workspace.num_jobs)
     ui.info("OK", ui.check)
@@ -10,8 +10,15 @@ import tsrc.workspace
 
 def main(args: argparse.Namespace) -> None:
     workspace_path = args.workspace_path or os.getcwd()
-    workspace = tsrc.workspace.Workspace(Path(workspace_path))
+    workspace = tsrc.workspace.Workspace(Path(workspace_path), num_jobs=args.num_jobs)
     ui.info_1("Configuring workspace in", ui.bold, workspace_path)
+    if args.bundles:
+        # Relative to the current directory, like any path on the command
+        # line, and not to the workspace
+        bundles_path = Path(args.bundles).abspath()
+        if not bundles_path.isdir():
+            ui.warning("Bundles directory", bundles_path, "does not exist")
+        args.bundles = str(bundles_path)
     manifest_options = tsrc.workspace.options_from_args(args)
     workspace.configure_manifest(manifest_options)
     workspace.load_manifest()
@@ -1,26 +1,236 @@
 """ Entry point for tsrc log """
 
 import argparse
+import concurrent.futures
+import contextlib
+import heapq
+import io
+import itertools
+import json
+import os
+import shlex
+import subprocess
 import sys
+import time
+from typing import Any, Dict, IO, Iterator, List, Optional  # noqa
 
+from path import Path
 import ui
 
 import tsrc.cli
 import tsrc.git
+import tsrc.workspace
+
+# Fields of each commit, for --format=json. They are separated
+# by the 'unit separator' control character, which cannot appear
+# in names nor in subjects
+LOG_FIELDS = [
+    ("sha1", "%H"),
+    ("author", "%an"),
+    ("email", "%ae"),
+    ("commit_date", "%ct"),
+    ("subject", "%s"),
+]
+FIELD_SEPARATOR = "\x1f"
+
+
+def get_machine_format() -> str:
+    return "%x1f".join(placeholder for _, placeholder in LOG_FIELDS)
+
+
+def parse_commit(record: str) -> Optional[Dict[str, Any]]:
+    """ Return None if `record` was not written with the machine format """
+    values = record.split(FIELD_SEPARATOR)
+    if len(values) != len(LOG_FIELDS):
+        return None
+    res = dict(zip((name for name, _ in LOG_FIELDS), values))  # type: Dict[str, Any]
+    try:
+        res["commit_date"] = int(res["commit_date"])
+    except ValueError:
+        return None
+    return res
+
+
+def print_json_log(src: str, full_path: Path, revisions: str) -> bool:
+    cmd = ["log", "-z", "--pretty=format:%s" % get_machine_format(), revisions]
+    obj = {"src": src, "rc": 0, "commits": list(), "error": None}  # type: Dict[str, Any]
+    try:
+        for record in tsrc.git.iter_git_records(full_path, *cmd):
+            commit = parse_commit(record)
+            if commit:
+                obj["commits"].append(commit)
+    except tsrc.git.GitCommandError as e:
+        obj["rc"] = e.returncode
+        obj["commits"] = list()
+        obj["error"] = e.output
+    tsrc.cli.print_json(obj)
+    return obj["rc"] == 0
+
+
+class LogStream:
+    """ The commits of one repo, parsed as soon as `git log` outputs them """
+    def __init__(self, src: str, full_path: Path, revisions: str) -> None:
+        self.src = src
+        self.error = None  # type: Optional[tsrc.git.GitCommandError]
+        cmd = ["log", "-z", "--pretty=format:%s" % get_machine_format(), revisions]
+        self.records = tsrc.git.iter_git_records(full_path, *cmd)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        try:
+            for record in self.records:
+                parsed = parse_commit(record)
+                if not parsed:
+                    continue
+                commit = {"src": self.src}  # type: Dict[str, Any]
+                commit.update(parsed)
+                yield commit
+        except tsrc.git.GitCommandError as e:
+            self.error = e
+
+    def start(self) -> Iterator[Dict[str, Any]]:
+        """ Start git, and wait for the first commit """
+        commits = iter(self)
+        first = next(commits, None)
+        if first is None:
+            return iter([])
+        return itertools.chain([first], commits)
+
+    def close(self) -> None:
+        self.records.close()
+
+
+def iter_merged_commits(streams: List[LogStream], num_jobs: int) -> Iterator[Dict[str, Any]]:
+    """ Yield the commits of all the streams, most recent first
+
+    All the `git log` processes run at the same time, but only the
+    next commit of each of them is kept in memory: the others wait in
+    the pipes, until the commits before them have been consumed.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_jobs) as pool:
+        started = list(pool.map(LogStream.start, streams))
+    # Like git log, ties are broken by the order of the manifest, then
+    # by the order of each log, so that commits are never compared
+    keyed = [
+        ((-commit["commit_date"], index, seq, commit) for seq, commit in enumerate(commits))
+        for index, commits in enumerate(started)
+    ]
+    for _, _, _, commit in heapq.merge(*keyed):
+        yield commit
+
+
+def describe_commit(commit: Dict[str, Any], max_src: int) -> List[Any]:
+    date = time.strftime("%Y-%m-%d %H:%M", time.localtime(commit["commit_date"]))
+    return [
+        ui.reset, date, ui.bold, commit["src"].ljust(max_src),
+        ui.reset, ui.green, commit["sha1"][:8], ui.reset, commit["subject"],
+        ui.bold, ui.blue, "<%s>" % commit["author"], ui.reset,
+    ]
+
+
+@contextlib.contextmanager
+def open_pager() -> Iterator[IO[str]]:
+    """ Yield the stdin of the pager when stdout is a terminal,
+    or stdout itself
+
+    The pager is $TSRC_PAGER, or $PAGER, or less.
+    """
+    pager_cmd = os.environ.get("TSRC_PAGER", os.environ.get("PAGER", "less"))
+    if not sys.stdout.isatty() or pager_cmd in ("", "cat"):
+        yield sys.stdout
+        return
+    env = os.environ.copy()
+    # Like git: quit if the output fits on one screen, keep colors,
+    # and do not clear the screen when quitting
+    env.setdefault("LESS", "FRX")
+    try:
+        pager = subprocess.Popen(shlex.split(pager_cmd), stdin=subprocess.PIPE, env=env)
+    except OSError:
+        yield sys.stdout
+        return
+    assert pager.stdin
+    pager_input = io.TextIOWrapper(pager.stdin, encoding="utf-8", write_through=True)
+    try:
+        yield pager_input
+    finally:
+        with contextlib.suppress(BrokenPipeError):
+            pager_input.close()
+        pager.wait()
+
+
+def format_text_line(commit: Dict[str, Any], max_src: int, color: bool) -> str:
+    with_color, without_color = ui.process_tokens(describe_commit(commit, max_src))
+    res = with_color if color else without_color  # type: str
+    return res
+
+
+def write_merged(lines: Iterator[str], use_pager: bool) -> None:
+    with contextlib.ExitStack() as stack:
+        out = stack.enter_context(open_pager()) if use_pager else sys.stdout
+        try:
+            for line in lines:
+                out.write(line)
+                out.flush()
+        except BrokenPipeError:
+            # The pager was closed, or the output was piped to a
+            # command like `head`: stop reading the logs
+            if out is sys.stdout:
+                # Do not fail again when Python flushes stdout at exit
+                devnull = os.open(os.devnull, os.O_WRONLY)
+                os.dup2(devnull, sys.stdout.fileno())
+
+
+def display_merged(workspace: tsrc.workspace.Workspace, revisions: str,
+                   args: argparse.Namespace) -> bool:
+    """ Display the commits of all the repos in a single timeline.
+    Return False if git log failed for any repo
+
+    """
+    repos = workspace.get_repos()
+    if not repos:
+        return True
+    streams = [
+        LogStream(repo.src, workspace.joinpath(repo.src), revisions)
+        for repo in repos
+    ]
+    try:
+        commits = iter_merged_commits(streams, workspace.num_jobs)
+        if args.output_format == "json":
+            json_lines = (json.dumps(commit) + "\n" for commit in commits)
+            write_merged(json_lines, use_pager=False)
+        else:
+            max_src = max(len(repo.src) for repo in repos)
+            color = ui.config_color(sys.stdout)
+            text_lines = (format_text_line(commit, max_src, color) for commit in commits)
+            write_merged(text_lines, use_pager=args.use_pager)
+    finally:
+        for stream in streams:
+            stream.close()
+    errors = [stream for stream in streams if stream.error]
+    for stream in errors:
+        ui.error(stream.src, ui.reset, str(stream.error))
+    return not errors
 
 
 def main(args: argparse.Namespace) -> None:
     workspace = tsrc.cli.get_workspace(args)
     workspace.load_manifest()
     all_ok = True
+    revisions = "%s...%s" % (args.from_, args.to)
+    if args.merged:
+        if not display_merged(workspace, revisions, args):
+            sys.exit(1)
+        return
     for unused_index, repo, full_path in workspace.enumerate_repos():
+        if args.output_format == "json":
+            all_ok = print_json_log(repo.src, full_path, revisions) and all_ok
+            continue
         colors = ["green", "reset", "yellow", "reset", "bold blue", "reset"]
         log_format = "%m {}%h{} - {}%d{} %s {}<%an>{}"
         log_format = log_format.format(*("%C({})".format(x) for x in colors))
         cmd = ["log",
                "--color=always",
                "--pretty=format:%s" % log_format,
-               "%s...%s" % (args.from_, args.to)]
+               revisions]
         rc, out = tsrc.git.run_git_captured(full_path, *cmd, check=False)
         if rc != 0:
             all_ok = False
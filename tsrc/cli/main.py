@@ -3,15 +3,21 @@
 import argparse
 import functools
 import importlib
+import multiprocessing
 import os
 import sys
 import textwrap
 from typing import Callable, List, Optional
 
 import colored_traceback
+from path import Path
 import ui
 
 import tsrc
+import tsrc.config
+import tsrc.journal
+import tsrc.timings
+import tsrc.trace
 
 ArgsList = Optional[List[str]]
 MainFunc = Callable[..., None]
@@ -52,10 +58,21 @@ def fix_cmd_args_for_foreach(args: argparse.Namespace,
     args.cmd_as_str = cmd_as_str
 
 
+def num_jobs(value: str) -> int:
+    res = int(value)
+    if res < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return res
+
+
 def workspace_subparser(
         subparser: argparse._SubParsersAction, name: str) -> argparse.ArgumentParser:
     parser = subparser.add_parser(name)
     parser.add_argument("-w", "--workspace", dest="workspace_path")
+    parser.add_argument("-j", "--jobs", dest="num_jobs", type=num_jobs,
+                        default=multiprocessing.cpu_count(),
+                        help="Number of repos to process in parallel "
+                             "(default: number of CPUs)")
     return parser
 
 
@@ -83,7 +100,18 @@ def setup_ui(args: argparse.Namespace) -> None:
         verbose = True
     if args.verbose:
         verbose = args.verbose
-    ui.setup(verbose=verbose, quiet=args.quiet, color=args.color)
+    quiet = args.quiet
+    if getattr(args, "output_format", "text") == "json":
+        # Keep stdout for the JSON objects
+        quiet = True
+    ui.setup(verbose=verbose, quiet=quiet, color=args.color)
+
+
+def add_format_option(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--format", choices=["text", "json"], default="text",
+                        dest="output_format",
+                        help="With json, write one JSON object per repo on stdout, "
+                             "as soon as it is known")
 
 
 @main_wrapper
@@ -95,14 +123,33 @@ def main(args: ArgsList = None) -> None:
     parser.add_argument("-q", "--quiet", help="Only display warnings and errors",
                         action="store_true")
     parser.add_argument("--color", choices=["auto", "always", "never"])
+    parser.add_argument("--timings", action="store_true",
+                        help="Show the slowest repos and the time spent in each phase")
+    parser.add_argument("--trace", dest="trace_path", metavar="FILE",
+                        help="Write a trace of the git calls to FILE, in the Chrome "
+                             "trace-event format, or in JSON lines if FILE ends with .jsonl")
 
     subparsers = parser.add_subparsers(title="subcommands", dest="command")
 
     subparsers.add_parser("version")
 
+    bundle_parser = workspace_subparser(subparsers, "bundle")
+    bundle_parser.add_argument("action", choices=["create"])
+    bundle_parser.add_argument("-o", "--output", dest="bundles_path", required=True,
+                               help="Directory where to write the bundle files")
+
+    workspace_subparser(subparsers, "daemon")
+
     foreach_parser = workspace_subparser(subparsers, "foreach")
     foreach_parser.add_argument("cmd", nargs="*")
     foreach_parser.add_argument("-c", dest="shell", action="store_true")
+    foreach_parser.add_argument("--output", choices=["buffered", "prefix"], default="buffered",
+                                help="With 'prefix', show the output of the commands "
+                                     "as it comes, prefixed with the repo names")
+    add_format_option(foreach_parser)
+    # Unlike the other commands, run one command at a time unless -j is used:
+    # the commands may be interactive, or may not support running in parallel
+    foreach_parser.set_defaults(num_jobs=1)
     foreach_parser.epilog = textwrap.dedent("""\
     Usage:
        # Run command directly
@@ -110,6 +157,13 @@ def main(args: ArgsList = None) -> None:
     Or:
        # Run command through the shell
        tsrc foreach -c 'some cmd'
+    Or:
+       # Run the command on 4 repos at a time. The output of each
+       # command is displayed once it is done
+       tsrc foreach -j 4 -- some-cmd
+    Or:
+       # Stream the output line by line, prefixed with the repo names
+       tsrc foreach -j 4 --output=prefix -- some-cmd
     """)
     foreach_parser.formatter_class = argparse.RawDescriptionHelpFormatter
 
@@ -118,11 +172,22 @@ def main(args: ArgsList = None) -> None:
     init_parser.add_argument("-b", "--branch")
     init_parser.add_argument("-g", "--group", action="append", dest="groups")
     init_parser.add_argument("-s", "--shallow", action="store_true", dest="shallow", default=False)
+    init_parser.add_argument("--filter", dest="clone_filter", metavar="FILTER_SPEC",
+                             help="Make partial clones, for instance with 'blob:none'")
+    init_parser.add_argument("--bundles", dest="bundles", metavar="BUNDLES_PATH",
+                             help="Clone from <src>.bundle files found in this directory, "
+                                  "then fetch the rest from the remotes")
     init_parser.set_defaults(branch="master")
 
     log_parser = workspace_subparser(subparsers, "log")
     log_parser.add_argument("--from", required=True, dest="from_", metavar="FROM")
     log_parser.add_argument("--to")
+    log_parser.add_argument("--merged", action="store_true",
+                            help="Show the commits of all the repos in a single list, "
+                                 "most recent first")
+    log_parser.add_argument("--no-pager", action="store_false", dest="use_pager",
+                            help="With --merged, do not use a pager")
+    add_format_option(log_parser)
     log_parser.set_defaults(to="HEAD")
 
     push_parser = workspace_subparser(subparsers, "push")
@@ -145,8 +210,20 @@ def main(args: ArgsList = None) -> None:
     message_group.add_argument("--wip", action="store_true", help="Mark merge request as WIP")
     message_group.add_argument("--ready", action="store_true", help="Mark merge request as ready")
 
-    workspace_subparser(subparsers, "status")
-    workspace_subparser(subparsers, "sync")
+    status_parser = workspace_subparser(subparsers, "status")
+    status_parser.add_argument("--no-cache", action="store_false", dest="use_cache",
+                               help="Do not ask the daemon, nor use the tags cached "
+                                    "in .tsrc/status-cache")
+    add_format_option(status_parser)
+    sync_parser = workspace_subparser(subparsers, "sync")
+    resume_group = sync_parser.add_mutually_exclusive_group()
+    resume_group.add_argument("--resume", action="store_const", dest="journal_mode",
+                              const=tsrc.journal.RESUME,
+                              help="Skip what an interrupted sync already did")
+    resume_group.add_argument("--retry-failed", action="store_const", dest="journal_mode",
+                              const=tsrc.journal.RETRY_FAILED,
+                              help="Only process again what failed during the last sync")
+    sync_parser.set_defaults(journal_mode=tsrc.journal.ALL)
 
     args_ns = parser.parse_args(args=args)  # type: argparse.Namespace
     setup_ui(args_ns)
@@ -159,4 +236,19 @@ def main(args: ArgsList = None) -> None:
     if command == "foreach":
         fix_cmd_args_for_foreach(args_ns, foreach_parser)
 
-    return module.main(args_ns)  # type: ignore
+    num_parses = tsrc.config.NUM_PARSES
+    if args_ns.timings:
+        tsrc.timings.enable()
+    if args_ns.trace_path:
+        tsrc.trace.start()
+    try:
+        with tsrc.trace.span("tsrc " + command, "command"):
+            return module.main(args_ns)  # type: ignore
+    finally:
+        if args_ns.trace_path:
+            tsrc.trace.stop(Path(args_ns.trace_path))
+        num_parses = tsrc.config.NUM_PARSES - num_parses
+        ui.debug("Parsed", num_parses, "config file(s)")
+        if args_ns.timings:
+            tsrc.timings.disable()
+            tsrc.timings.report()
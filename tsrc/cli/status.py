@@ -1,12 +1,16 @@
 """ Entry point for tsrc status """
 
 import argparse
-from typing import List, Tuple
-import shutil
+import concurrent.futures
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple  # noqa
+
+from path import Path
 
 import ui
 
 import tsrc.cli
+import tsrc.daemon
+import tsrc.status_cache
 from tsrc.git import GitStatus
 from tsrc.workspace import Workspace
 
@@ -59,38 +63,78 @@ def describe(git_status: GitStatus) -> List[str]:
     return res
 
 
-def collect_statuses(workspace: Workspace) -> List[Tuple[str, GitStatus]]:
-    result = list()  # type: List[Tuple[str, GitStatus]]
-    repos = workspace.get_repos()
-
-    if not repos:
-        return result
-
-    num_repos = len(repos)
-    max_len = max((len(x.src) for x in repos))
-    for i, repo, full_path in workspace.enumerate_repos():
-        ui.info_count(i, num_repos,
-                      "Checking", repo.src.ljust(max_len + 1), end="\r")
-        status = tsrc.git.get_status(full_path)
-        result.append((repo.src, status))
+def get_status(working_path: Path, src: str,
+               cache: Optional[tsrc.status_cache.StatusCache]) -> GitStatus:
+    status = GitStatus(working_path)
+    status.update_from_status()
+    if cache:
+        status.tag = cache.get_tag(src, working_path)
+    else:
+        status.update_tag()
+    return status
 
-    terminal_size = shutil.get_terminal_size()
-    ui.info(" " * terminal_size.columns, end="\r")
-    return result
 
+def iter_statuses(workspace: Workspace, cache: Optional[tsrc.status_cache.StatusCache] = None
+                  ) -> Iterator[Tuple[str, GitStatus]]:
+    """ Collect the statuses of the repos on a pool of threads, and
+    yield them in the order of the manifest, each one as soon as it
+    and the ones before it are known
 
-def display_statuses(statuses: List[Tuple[str, GitStatus]]) -> None:
-    if not statuses:
+    """
+    repos = workspace.get_repos()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workspace.num_jobs) as pool:
+        futures = [
+            pool.submit(get_status, workspace.joinpath(repo.src), repo.src, cache)
+            for repo in repos
+        ]
+        try:
+            for repo, future in zip(repos, futures):
+                yield repo.src, future.result()
+        except BaseException:
+            # Errors, KeyboardInterrupt, or the caller stopped iterating:
+            # do not start checking any new repo
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def display_statuses(workspace: Workspace, statuses: Iterable[Tuple[str, GitStatus]]) -> None:
+    repos = workspace.get_repos()
+    if not repos:
         return
-    max_src = max((len(x[0]) for x in statuses))
+    max_src = max((len(x.src) for x in repos))
     for src, status in statuses:
         message = [ui.green, "*", ui.reset, src.ljust(max_src)]
         message += describe(status)
         ui.info(*message)
 
 
+def print_json_statuses(statuses: Iterable[Tuple[str, GitStatus]]) -> None:
+    for src, status in statuses:
+        obj = {"src": src}  # type: Dict[str, Any]
+        obj.update(tsrc.daemon.status_to_dict(status))
+        tsrc.cli.print_json(obj)
+
+
 def main(args: argparse.Namespace) -> None:
     workspace = tsrc.cli.get_workspace(args)
     workspace.load_manifest()
-    statuses = collect_statuses(workspace)
-    display_statuses(statuses)
+
+    def display(statuses: Iterable[Tuple[str, GitStatus]]) -> None:
+        if args.output_format == "json":
+            print_json_statuses(statuses)
+        else:
+            display_statuses(workspace, statuses)
+
+    if args.use_cache:
+        from_daemon = tsrc.daemon.get_statuses(workspace)
+        if from_daemon is not None:
+            display(from_daemon)
+            return
+    cache = None
+    if args.use_cache:
+        cache = tsrc.status_cache.StatusCache(workspace.joinpath(".tsrc", "status-cache"))
+        cache.load()
+    display(iter_statuses(workspace, cache=cache))
+    if cache:
+        cache.save()
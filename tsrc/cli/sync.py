@@ -4,10 +4,15 @@ import argparse
 import ui
 
 import tsrc.cli
+import tsrc.journal
 
 
 def main(args: argparse.Namespace) -> None:
     workspace = tsrc.cli.get_workspace(args)
+    journal_path = workspace.joinpath(".tsrc", "sync-journal")
+    journal = tsrc.journal.Journal(journal_path, mode=args.journal_mode)
+    journal.start()
+    workspace.journal = journal
     workspace.update_manifest()
     workspace.load_manifest()
     active_groups = workspace.active_groups
@@ -17,4 +22,5 @@ def main(args: argparse.Namespace) -> None:
     workspace.set_remotes()
     workspace.sync()
     workspace.copy_files()
+    journal.finish()
     ui.info("Done", ui.check)
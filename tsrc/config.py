@@ -3,16 +3,21 @@
 from path import Path
 import ruamel.yaml
 import schema
-from typing import Any, Dict, NewType
+from typing import Any, Dict, NewType, Optional
 import xdg
 
 import tsrc
 
 Config = NewType('Config', Dict[str, Any])
 
+# Number of config files parsed so far, reported in debug messages
+NUM_PARSES = 0
+
 
 def parse_config_file(
         file_path: Path, config_schema: schema.Schema, roundtrip: bool = False) -> Config:
+    global NUM_PARSES
+    NUM_PARSES += 1
     try:
         contents = file_path.text()
     except OSError as os_error:
@@ -43,12 +48,38 @@ def dump_tsrc_config(config: Config) -> None:
     file_path.write_text(dumped)
 
 
+MIRRORS_SCHEMA = {
+    "path": str,
+    schema.Optional("dissociate"): bool,
+}
+
+
 def parse_tsrc_config(config_path: Path = None, roundtrip: bool = False) -> Config:
     auth_schema = {
         schema.Optional("gitlab"): {"token": str},
         schema.Optional("github"): {"token": str},
     }
-    tsrc_schema = schema.Schema({"auth": auth_schema})
+    tsrc_schema = schema.Schema({
+        schema.Optional("auth"): auth_schema,
+        schema.Optional("mirrors"): MIRRORS_SCHEMA,
+    })
     if not config_path:
         config_path = get_tsrc_config_path()
     return parse_config_file(config_path, tsrc_schema, roundtrip=roundtrip)
+
+
+def parse_mirrors_config(config_path: Path = None) -> Optional[Dict[str, Any]]:
+    """ Return the `mirrors` section of tsrc.yml, if any
+
+    The other sections are not validated, so that a mistake in them
+    only breaks the commands that use them.
+    """
+    mirrors_schema = schema.Schema({
+        schema.Optional("mirrors"): MIRRORS_SCHEMA,
+        schema.Optional(str): object,
+    })
+    if not config_path:
+        config_path = get_tsrc_config_path()
+    config = parse_config_file(config_path, mirrors_schema)
+    res = config.get("mirrors")  # type: Optional[Dict[str, Any]]
+    return res
@@ -0,0 +1,374 @@
+""" Keep the status of every repo of a workspace up to date, and serve
+it over a Unix socket, so that `tsrc status` does not have to run git
+
+Started with `tsrc daemon`. Linux only: changes are detected with
+inotify, called through ctypes.
+
+The protocol is one JSON object per line: the client sends
+{"command": "status"}, and the daemon answers with
+{"repos": [{"src": ..., "status": {...}}, ...]}, in the order of
+the manifest.
+
+"""
+
+import concurrent.futures
+import ctypes
+import ctypes.util
+import json
+import os
+import selectors
+import socket
+import struct
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple  # noqa
+
+from path import Path
+import ui
+
+import tsrc
+import tsrc.git
+from tsrc.git import GitStatus
+from tsrc.workspace import Workspace
+
+SOCKET_NAME = "daemon.sock"
+# Longest path that fits in sockaddr_un
+MAX_SOCKET_PATH = 107
+# Wait for things to settle before recomputing the status of
+# a repo, so that `git checkout` does not trigger hundreds of updates
+DEBOUNCE_DELAY = 0.1
+CLIENT_TIMEOUT = 1.0
+LISTEN_BACKLOG = 16
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+STATUS_FIELDS = ["untracked", "staged", "not_staged", "added", "ahead", "behind",
+                 "dirty", "tag", "branch", "sha1"]
+
+
+class DaemonError(tsrc.Error):
+    pass
+
+
+def status_to_dict(status: GitStatus) -> Dict[str, Any]:
+    return {name: getattr(status, name) for name in STATUS_FIELDS}
+
+
+def status_from_dict(working_path: Path, as_dict: Dict[str, Any]) -> GitStatus:
+    res = GitStatus(working_path)
+    for name in STATUS_FIELDS:
+        setattr(res, name, as_dict[name])
+    return res
+
+
+def get_socket_path(workspace: Workspace) -> Path:
+    return workspace.joinpath(".tsrc", SOCKET_NAME)
+
+
+class Inotify:
+    """ Minimal wrapper around the inotify system calls """
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library("c")
+        try:
+            self.libc = ctypes.CDLL(libc_name, use_errno=True)
+            init = self.libc.inotify_init1
+        except (OSError, AttributeError):
+            raise DaemonError("inotify is not available on this system")
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise DaemonError("inotify_init1 failed:", os.strerror(ctypes.get_errno()))
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add_watch(self, path: Path, mask: int) -> int:
+        res = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)  # type: int
+        if res < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return res
+
+    def read_events(self) -> List[Tuple[int, int, str]]:
+        """ Return a list of (watch descriptor, mask, name) """
+        res = list()  # type: List[Tuple[int, int, str]]
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return res
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            res.append((wd, mask, os.fsdecode(name)))
+        return res
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class StatusDaemon:
+    def __init__(self, workspace: Workspace) -> None:
+        self.workspace = workspace
+        self.socket_path = get_socket_path(workspace)
+        self.inotify = Inotify()
+        self.selector = selectors.DefaultSelector()
+        self.server = None  # type: Optional[socket.socket]
+        self.repos = list()  # type: List[tsrc.Repo]
+        self.statuses = dict()  # type: Dict[str, Dict[str, Any]]
+        # watch descriptor -> (src, watched directory)
+        self.watches = dict()  # type: Dict[int, Tuple[str, Path]]
+        # Repos whose status must be computed again
+        self.dirty = set()  # type: Set[str]
+        # Repos that could not be watched, and whose status is
+        # computed again for each query
+        self.unwatched = set()  # type: Set[str]
+        self.last_event_time = 0.0
+        self.manifest_signature = None  # type: Optional[List[Any]]
+        self.stop_requested = False
+
+    def get_manifest_signature(self) -> List[Any]:
+        res = list()  # type: List[Any]
+        local_manifest = self.workspace.local_manifest
+        for path in (local_manifest.cfg_path,
+                     local_manifest.clone_path.joinpath("manifest.yml")):
+            try:
+                stat = path.stat()
+                res.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                res.append(None)
+        return res
+
+    def load(self) -> None:
+        """ (Re)load the manifest, and watch all the repos """
+        self.manifest_signature = self.get_manifest_signature()
+        self.workspace.load_manifest()
+        self.repos = self.workspace.get_repos()
+        srcs = {repo.src for repo in self.repos}
+        self.statuses = {src: s for src, s in self.statuses.items() if src in srcs}
+        watched = {src for (src, _) in self.watches.values()}
+        for repo in self.repos:
+            if repo.src not in watched and repo.src not in self.unwatched:
+                self.watch_repo(repo.src)
+        self.dirty = set(srcs)
+
+    def watch_repo(self, src: str) -> None:
+        repo_path = self.workspace.joinpath(src)
+        if not repo_path.isdir():
+            self.unwatched.add(src)
+            return
+        try:
+            self.watch_tree(src, repo_path)
+            git_path = repo_path.joinpath(".git")
+            if git_path.isdir():
+                # HEAD, index, packed-refs ... and the refs, but not the objects
+                self.add_watch(src, git_path)
+                self.watch_tree(src, git_path.joinpath("refs"))
+        except OSError as error:
+            # Typically ENOSPC when fs.inotify.max_user_watches is reached
+            ui.warning("Could not watch", src, "-", error)
+            self.unwatched.add(src)
+
+    def watch_tree(self, src: str, top_path: Path) -> None:
+        for dir_name, sub_dirs, _ in os.walk(top_path):
+            if ".git" in sub_dirs:
+                sub_dirs.remove(".git")
+            self.add_watch(src, Path(dir_name))
+
+    def add_watch(self, src: str, dir_path: Path) -> None:
+        wd = self.inotify.add_watch(dir_path, WATCH_MASK)
+        self.watches[wd] = (src, dir_path)
+
+    def handle_events(self) -> None:
+        while True:
+            events = self.inotify.read_events()
+            if not events:
+                return
+            self.process_events(events)
+            self.last_event_time = time.monotonic()
+
+    def process_events(self, events: List[Tuple[int, int, str]]) -> None:
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                self.dirty.update(repo.src for repo in self.repos)
+                continue
+            watch = self.watches.get(wd)
+            if not watch:
+                continue
+            src, dir_path = watch
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+            self.dirty.add(src)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and name != ".git":
+                try:
+                    self.watch_tree(src, dir_path.joinpath(name))
+                except OSError:
+                    pass
+
+    def refresh(self) -> None:
+        # Like the repos that are not watched, the repos whose status
+        # could not be computed are checked again each time
+        to_update = [repo.src for repo in self.repos
+                     if repo.src in self.dirty or repo.src in self.unwatched
+                     or "error" in self.statuses.get(repo.src, {"error": None})]
+        if not to_update:
+            return
+        # Events that arrive while the statuses are computed will
+        # mark the repos dirty again
+        self.dirty.clear()
+        num_jobs = self.workspace.num_jobs
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_jobs) as pool:
+            results = pool.map(self.compute_status, to_update)
+            for src, result in zip(to_update, results):
+                self.statuses[src] = result
+
+    def compute_status(self, src: str) -> Dict[str, Any]:
+        try:
+            status = tsrc.git.get_status(self.workspace.joinpath(src))
+        except tsrc.Error as error:
+            return {"error": error.message}
+        except Exception as error:
+            # Report it as the error of this repo, rather than
+            # stopping the daemon
+            return {"error": "%s: %s" % (type(error).__name__, error)}
+        return {"status": status_to_dict(status)}
+
+    def handle_client(self, conn: socket.socket) -> None:
+        conn.settimeout(CLIENT_TIMEOUT)
+        with conn:
+            try:
+                request = json.loads(read_line(conn).decode("utf-8"))
+            except (OSError, ValueError):
+                return
+            if not isinstance(request, dict) or request.get("command") != "status":
+                response = {"error": "unknown command"}  # type: Dict[str, Any]
+            else:
+                response = self.get_statuses()
+            try:
+                conn.sendall(json.dumps(response).encode() + b"\n")
+            except OSError:
+                pass
+
+    def get_statuses(self) -> Dict[str, Any]:
+        if self.get_manifest_signature() != self.manifest_signature:
+            self.load()
+        # Make sure the changes made just before the query are taken into account
+        self.handle_events()
+        self.refresh()
+        repos = list()
+        for repo in self.repos:
+            entry = {"src": repo.src}
+            entry.update(self.statuses[repo.src])
+            repos.append(entry)
+        return {"repos": repos}
+
+    def serve_forever(self) -> None:
+        if len(self.socket_path) > MAX_SOCKET_PATH:
+            raise DaemonError("Socket path is too long:", self.socket_path)
+        if query(self.workspace, {"command": "status"}) is not None:
+            raise DaemonError("A daemon is already running for this workspace")
+        # Otherwise `git status` may refresh the index, which would
+        # trigger new events, and a new `git status` ...
+        os.environ["GIT_OPTIONAL_LOCKS"] = "0"
+        self.load()
+        self.refresh()
+        self.socket_path.remove_p()
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.server.bind(self.socket_path)
+            self.server.listen(LISTEN_BACKLOG)
+            self.selector.register(self.server, selectors.EVENT_READ)
+            self.selector.register(self.inotify, selectors.EVENT_READ)
+            ui.info(ui.green, "*", ui.reset, "Listening on", self.socket_path)
+            self.loop()
+        finally:
+            self.server.close()
+            self.socket_path.remove_p()
+            self.selector.close()
+            self.inotify.close()
+
+    def loop(self) -> None:
+        assert self.server
+        while not self.stop_requested:
+            timeout = 0.5
+            if self.dirty:
+                elapsed = time.monotonic() - self.last_event_time
+                timeout = max(DEBOUNCE_DELAY - elapsed, 0)
+            for key, _ in self.selector.select(timeout):
+                if key.fileobj is self.server:
+                    conn, _ = self.server.accept()
+                    self.handle_client(conn)
+                else:
+                    self.handle_events()
+            if self.dirty and time.monotonic() - self.last_event_time >= DEBOUNCE_DELAY:
+                self.refresh()
+
+
+def read_line(conn: socket.socket) -> bytes:
+    res = b""
+    while not res.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        res += chunk
+    return res
+
+
+def query(workspace: Workspace, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """ Send a request to the daemon of the workspace, and return
+    its response, or None if no daemon could answer
+
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    socket_path = get_socket_path(workspace)
+    if not socket_path.exists() or len(socket_path) > MAX_SOCKET_PATH:
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(CLIENT_TIMEOUT)
+            conn.connect(socket_path)
+            conn.sendall(json.dumps(request).encode() + b"\n")
+            res = json.loads(read_line(conn).decode("utf-8"))  # type: Dict[str, Any]
+    except (OSError, ValueError):
+        return None
+    if not isinstance(res, dict) or "error" in res:
+        return None
+    return res
+
+
+def get_statuses(workspace: Workspace) -> Optional[List[Tuple[str, GitStatus]]]:
+    """ Return the statuses known by the daemon, or None if there is no
+    daemon, or if it does not use the same repos as `workspace`
+
+    """
+    response = query(workspace, {"command": "status"})
+    if response is None:
+        return None
+    entries = response.get("repos", list())
+    srcs = [repo.src for repo in workspace.get_repos()]
+    if [entry.get("src") for entry in entries] != srcs:
+        return None
+    res = list()
+    for entry in entries:
+        if "status" not in entry:
+            # Let the caller report the error
+            return None
+        src = entry["src"]
+        res.append((src, status_from_dict(workspace.joinpath(src), entry["status"])))
+    return res
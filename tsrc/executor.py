@@ -1,11 +1,18 @@
 """ Helpers to run things on multiple repos and collect errors """
 
 import abc
-from typing import Generic, List, Tuple, TypeVar  # noqa
+import contextlib
+import concurrent.futures
+import sys
+from typing import Generic, List, Optional, Tuple, TypeVar  # noqa
 
 import ui
 
 import tsrc
+import tsrc.journal
+import tsrc.output
+import tsrc.timings
+import tsrc.trace
 
 
 T = TypeVar('T')
@@ -24,6 +31,15 @@ class Task(Generic[T], metaclass=abc.ABCMeta):
     def quiet(self) -> bool:
         return False
 
+    def capture_output(self) -> bool:
+        """ Whether the output of each item should be captured when
+        the items are processed in parallel, and displayed in one block
+        once the item is done. Tasks that take care of that themselves
+        return False
+
+        """
+        return True
+
     @abc.abstractmethod
     def display_item(self, item: T) -> str:
         pass
@@ -34,11 +50,42 @@ class Task(Generic[T], metaclass=abc.ABCMeta):
 
 
 class SequentialExecutor(Generic[T]):
-    def __init__(self, task: Task[T]) -> None:
+    def __init__(self, task: Task[T],
+                 journal: Optional[tsrc.journal.Journal] = None) -> None:
         self.task = task
+        self.journal = journal
         self.errors = list()  # type: List[Tuple[T, tsrc.Error]]
 
+    @property
+    def task_name(self) -> str:
+        return type(self.task).__name__
+
+    def skip_done(self, items: List[T]) -> List[T]:
+        """ Remove the items the journal says need not be processed again """
+        if not self.journal:
+            return items
+        res = [
+            item for item in items
+            if not self.journal.should_skip(self.task_name, self.task.display_item(item))
+        ]
+        num_skipped = len(items) - len(res)
+        if num_skipped:
+            ui.info_2(self.task.description(), "-", "skipping", num_skipped,
+                      "item(s) already processed")
+        return res
+
+    def process_item(self, item: T) -> None:
+        item_desc = self.task.display_item(item)
+        with tsrc.trace.span(item_desc, "item"):
+            with tsrc.timings.item(self.task.description(), item_desc):
+                self.task.process(item)
+
+    def record(self, item: T, ok: bool) -> None:
+        if self.journal:
+            self.journal.record(self.task_name, self.task.display_item(item), ok)
+
     def process(self, items: List[T]) -> None:
+        items = self.skip_done(items)
         if not items:
             return
         ui.info_1(self.task.description())
@@ -65,11 +112,103 @@ class SequentialExecutor(Generic[T]):
 
     def process_one(self, item: T) -> None:
         try:
-            self.task.process(item)
+            self.process_item(item)
         except tsrc.Error as error:
             self.errors.append((item, error))
+            self.record(item, ok=False)
+        else:
+            self.record(item, ok=True)
+
+
+class ParallelExecutor(SequentialExecutor[T]):
+    """ Process items on a bounded pool of worker threads
+
+    Errors are collected and reported exactly like in SequentialExecutor,
+    in the order of the items, regardless of the order in which
+    they completed.
 
+    """
+    def __init__(self, task: Task[T], num_jobs: int,
+                 journal: Optional[tsrc.journal.Journal] = None) -> None:
+        super().__init__(task, journal=journal)
+        self.num_jobs = num_jobs
 
-def run_sequence(items: List[T], task: Task) -> None:
-    executor = SequentialExecutor(task)
-    return executor.process(items)
+    def process(self, items: List[T]) -> None:
+        items = self.skip_done(items)
+        if not items:
+            return
+        ui.info_1(self.task.description())
+
+        self.errors = list()
+        num_items = len(items)
+        with contextlib.ExitStack() as stack:
+            if self.task.capture_output():
+                stack.enter_context(tsrc.output.redirect())
+            pool = stack.enter_context(
+                concurrent.futures.ThreadPoolExecutor(max_workers=self.num_jobs))
+            futures = [pool.submit(self.try_process, item) for item in items]
+            item_for_future = dict(zip(futures, items))
+            try:
+                done = concurrent.futures.as_completed(futures)
+                for i, future in enumerate(done):
+                    error, output = future.result()
+                    self.item_done(item_for_future[future], error, output, i, num_items)
+            except BaseException:
+                # Typically KeyboardInterrupt or SystemExit from ui.fatal():
+                # do not start any new item and let the running ones finish
+                for future in futures:
+                    future.cancel()
+                raise
+
+        for item, future in zip(items, futures):
+            error, _ = future.result()
+            if error:
+                self.errors.append((item, error))
+
+        if self.errors:
+            self.handle_errors()
+
+    def item_done(self, item: T, error: Optional[tsrc.Error], output: str,
+                  index: int, num_items: int) -> None:
+        """ Called from the main thread, in the order the items complete """
+        # Only the main thread writes to the journal
+        self.record(item, ok=not error)
+        if self.task.capture_output():
+            # Display the captured output after the counter,
+            # like SequentialExecutor does
+            if not self.task.quiet():
+                ui.info_count(index, num_items, end="")
+            sys.stdout.write(output)
+            sys.stdout.flush()
+        elif not self.task.quiet():
+            item_desc = self.task.display_item(item)
+            mark = ui.cross if error else ui.check
+            ui.info_count(index, num_items, item_desc, mark)
+
+    def try_process(self, item: T) -> Tuple[Optional[tsrc.Error], str]:
+        """ Return the error raised when processing the item, if any,
+        and its captured output
+
+        """
+        if not self.task.capture_output():
+            return self.try_process_item(item), ""
+        with tsrc.output.capture() as output:
+            error = self.try_process_item(item)
+        return error, output.getvalue()
+
+    def try_process_item(self, item: T) -> Optional[tsrc.Error]:
+        try:
+            self.process_item(item)
+        except tsrc.Error as error:
+            return error
+        return None
+
+
+def run_sequence(items: List[T], task: Task, num_jobs: int = 1,
+                 journal: Optional[tsrc.journal.Journal] = None) -> None:
+    if num_jobs > 1 and len(items) > 1:
+        executor = ParallelExecutor(task, num_jobs, journal=journal)  # type: SequentialExecutor
+    else:
+        executor = SequentialExecutor(task, journal=journal)
+    with tsrc.trace.span(task.description(), "phase", num_items=len(items)):
+        executor.process(items)
@@ -1,14 +1,19 @@
 """ git tools """
 
 
+import codecs
 import os
 import subprocess
-from typing import Any, Dict, Iterable, Tuple, Optional  # noqa
+from typing import Any, ContextManager, Dict, Generator, Iterable, List, Tuple, Optional  # noqa
 
 from path import Path
 import ui
 
 import tsrc
+import tsrc.gitdir
+import tsrc.output
+import tsrc.timings
+import tsrc.trace
 
 
 class GitError(tsrc.Error):
@@ -18,10 +23,11 @@ class GitError(tsrc.Error):
 class GitCommandError(GitError):
     def __init__(
             self, working_path: Path, cmd: Iterable[str], *,
-            output: Optional[str] = None) -> None:
+            output: Optional[str] = None, returncode: Optional[int] = None) -> None:
         self.cmd = cmd
         self.working_path = working_path
         self.output = output
+        self.returncode = returncode
         message = "`git {cmd}` from {working_path} failed"
         message = message.format(cmd=" ".join(cmd), working_path=working_path)
         if output:
@@ -44,20 +50,53 @@ class GitStatus:
         self.sha1 = None   # type: Optional[str]
 
     def update(self) -> None:
-        self.update_sha1()
-        self.update_branch()
+        self.update_from_status()
         self.update_tag()
-        self.update_remote_status()
-        self.update_worktree_status()
 
-    def update_sha1(self) -> None:
-        self.sha1 = get_sha1(self.working_path, short=True)
-
-    def update_branch(self) -> None:
-        try:
-            self.branch = get_current_branch(self.working_path)
-        except GitError:
-            pass
+    def update_from_status(self) -> None:
+        """ Fill sha1, branch, ahead, behind and the worktree counts
+        with a single `git status` call
+
+        """
+        cmd = ("status", "--porcelain=v2", "--branch", "-z")
+        records = iter_git_records(self.working_path, *cmd)
+        for record in records:
+            if record.startswith("2 "):
+                # Renames and copies are followed by the original path
+                next(records, None)
+            self.parse_record(record)
+
+    def parse_record(self, record: str) -> None:
+        if record.startswith("# "):
+            self.parse_header(record[2:])
+        elif record.startswith("? "):
+            self.untracked += 1
+            self.dirty = True
+        elif record[:2] in ("1 ", "2 ", "u "):
+            self.parse_change(record[2:4])
+
+    def parse_header(self, header: str) -> None:
+        key, _, value = header.partition(" ")
+        if key == "branch.oid":
+            if value != "(initial)":
+                self.sha1 = value[:7]
+        elif key == "branch.head":
+            if value != "(detached)":
+                self.branch = value
+        elif key == "branch.ab":
+            ahead, behind = value.split()
+            self.ahead = abs(int(ahead))
+            self.behind = abs(int(behind))
+
+    def parse_change(self, xy: str) -> None:
+        index_status, worktree_status = xy[0], xy[1]
+        self.dirty = True
+        if index_status == "A":
+            self.added += 1
+        elif index_status != ".":
+            self.staged += 1
+        if worktree_status != ".":
+            self.not_staged += 1
 
     def update_tag(self) -> None:
         try:
@@ -65,41 +104,6 @@ class GitStatus:
         except GitError:
             pass
 
-    def update_remote_status(self) -> None:
-        rc, ahead_rev = run_git_captured(
-            self.working_path,
-            "rev-list", "@{upstream}..HEAD",
-            check=False
-        )
-        if rc == 0:
-            self.ahead = len(ahead_rev.splitlines())
-
-        rc, behind_rev = run_git_captured(
-            self.working_path,
-            "rev-list",
-            "HEAD..@{upstream}",
-            check=False
-        )
-        if rc == 0:
-            self.behind = len(behind_rev.splitlines())
-
-    def update_worktree_status(self) -> None:
-        _, out = run_git_captured(self.working_path, "status", "--porcelain")
-
-        for line in out.splitlines():
-            if line.startswith("??"):
-                self.untracked += 1
-                self.dirty = True
-            if line.startswith(" M"):
-                self.staged += 1
-                self.dirty = True
-            if line.startswith(" .M"):
-                self.not_staged += 1
-                self.dirty = True
-            if line.startswith("A "):
-                self.added += 1
-                self.dirty = True
-
 
 class WorktreeNotFound(GitError):
     def __init__(self, working_path: Path) -> None:
@@ -109,13 +113,27 @@ class WorktreeNotFound(GitError):
 def run_git(working_path: Path, *cmd: str) -> None:
     """ Run git `cmd` in given `working_path`
 
+    The output of git is captured if the current thread captures
+    its output (see tsrc.output).
+
     Raise GitCommandError if return code is non-zero.
     """
     git_cmd = list(cmd)
     git_cmd.insert(0, "git")
 
     ui.debug(ui.lightgray, working_path, "$", ui.reset, *git_cmd)
-    returncode = subprocess.call(git_cmd, cwd=working_path)
+    buffer = tsrc.output.get_buffer()
+    with trace_git(working_path, git_cmd) as span_args:
+        with tsrc.timings.git_call(working_path, cmd):
+            if buffer is None:
+                returncode = subprocess.call(git_cmd, cwd=working_path)
+            else:
+                process = subprocess.Popen(git_cmd, cwd=working_path,
+                                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                out, _ = process.communicate()
+                buffer.write(out.decode("utf-8", errors="replace"))
+                returncode = process.returncode
+        span_args["returncode"] = returncode
     if returncode != 0:
         raise GitCommandError(working_path, cmd)
 
@@ -134,8 +152,11 @@ def run_git_captured(working_path: Path, *cmd: str, check: bool = True) -> Tuple
     options["stderr"] = subprocess.STDOUT
 
     ui.debug(ui.lightgray, working_path, "$", ui.reset, *git_cmd)
-    process = subprocess.Popen(git_cmd, cwd=working_path, **options)
-    out, _ = process.communicate()
+    with trace_git(working_path, git_cmd) as span_args:
+        with tsrc.timings.git_call(working_path, cmd):
+            process = subprocess.Popen(git_cmd, cwd=working_path, **options)
+            out, _ = process.communicate()
+        span_args["returncode"] = process.returncode
     out = out.decode("utf-8")
     if out.endswith('\n'):
         out = out.strip('\n')
@@ -146,7 +167,65 @@ def run_git_captured(working_path: Path, *cmd: str, check: bool = True) -> Tuple
     return returncode, out
 
 
+def iter_git_records(working_path: Path, *cmd: str,
+                     sep: str = "\0") -> Generator[str, None, None]:
+    """ Run git `cmd` in given `working_path`, and yield the records
+    of its output (separated by `sep`) as soon as they are read.
+
+    Raise GitCommandError if return code is non-zero, once all the
+    records have been consumed. If the generator is closed before that,
+    git is killed.
+    """
+    git_cmd = list(cmd)
+    git_cmd.insert(0, "git")
+
+    ui.debug(ui.lightgray, working_path, "$", ui.reset, *git_cmd)
+    tsrc.timings.count_git_call()
+    # Note: the span also covers the time spent by the caller
+    # processing the records
+    with trace_git(working_path, git_cmd) as span_args:
+        process = subprocess.Popen(git_cmd, cwd=working_path,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        assert process.stdout
+        assert process.stderr
+        pending = ""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            for chunk in iter(lambda: process.stdout.read1(65536), b""):  # type: ignore
+                pending += decoder.decode(chunk)
+                *records, pending = pending.split(sep)
+                yield from records
+        except GeneratorExit:
+            # The caller stopped iterating: no need to let git finish
+            process.kill()
+            process.wait()
+            process.stdout.close()
+            process.stderr.close()
+            raise
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending
+        process.stdout.close()
+        err = process.stderr.read().decode("utf-8", errors="replace").strip()
+        process.stderr.close()
+        returncode = process.wait()
+        span_args["returncode"] = returncode
+    ui.debug(ui.lightgray, "[%i]" % returncode, ui.reset, err)
+    if returncode != 0:
+        raise GitCommandError(working_path, cmd, output=err, returncode=returncode)
+
+
+def trace_git(working_path: Path, git_cmd: List[str]) -> ContextManager[Dict[str, Any]]:
+    name = " ".join(git_cmd[:2])
+    return tsrc.trace.span(name, "git", argv=git_cmd, cwd=str(working_path))
+
+
 def get_sha1(working_path: Path, short: bool = False) -> str:
+    if not short:
+        try:
+            return tsrc.gitdir.get_head_sha1(working_path)
+        except tsrc.gitdir.Unsupported:
+            pass
     cmd = ["rev-parse"]
     if short:
         cmd.append("--short")
@@ -156,8 +235,11 @@ def get_sha1(working_path: Path, short: bool = False) -> str:
 
 
 def get_current_branch(working_path: Path) -> str:
-    cmd = ("rev-parse", "--abbrev-ref", "HEAD")
-    _, output = run_git_captured(working_path, *cmd)
+    try:
+        output = tsrc.gitdir.get_current_branch(working_path)
+    except tsrc.gitdir.Unsupported:
+        cmd = ("rev-parse", "--abbrev-ref", "HEAD")
+        _, output = run_git_captured(working_path, *cmd)
     if output == "HEAD":
         raise GitError("Not an any branch")
     return output
@@ -195,6 +277,21 @@ def reset(repo: Path, ref: str) -> None:
     run_git(repo, "reset", "--hard", ref)
 
 
+def is_sparse_checkout(working_path: Path) -> bool:
+    try:
+        git_dir = tsrc.gitdir.find(working_path)
+        # Written by the first `git sparse-checkout`: without it, there is
+        # no need to run `git config`
+        if not git_dir.git_dir.joinpath("info", "sparse-checkout").exists():
+            return False
+    except tsrc.gitdir.Unsupported:
+        pass
+    # core.sparseCheckout may be set in config.worktree, so let git read it
+    _, out = run_git_captured(working_path, "config", "--bool", "core.sparseCheckout",
+                              check=False)
+    return out == "true"
+
+
 def get_status(working_path: Path) -> GitStatus:
     status = GitStatus(working_path)
     status.update()
@@ -202,6 +299,10 @@ def get_status(working_path: Path) -> GitStatus:
 
 
 def get_tracking_ref(working_path: Path) -> Optional[str]:
+    try:
+        return tsrc.gitdir.get_tracking_ref(working_path)
+    except tsrc.gitdir.Unsupported:
+        pass
     rc, out = run_git_captured(
         working_path,
         "rev-parse", "--abbrev-ref",
@@ -214,6 +315,83 @@ def get_tracking_ref(working_path: Path) -> Optional[str]:
         return None
 
 
+def get_remote_refs(working_path: Path, remote: str) -> Dict[str, str]:
+    """ Return the sha1 of every branch and tag of the given remote """
+    _, out = run_git_captured(working_path, "ls-remote", "--heads", "--tags", remote)
+    res = dict()  # type: Dict[str, str]
+    for line in out.splitlines():
+        sha1, _, ref_name = line.partition("\t")
+        # Skip messages from stderr and the peeled values of annotated tags
+        if not ref_name or ref_name.endswith("^{}"):
+            continue
+        res[ref_name] = sha1
+    return res
+
+
+def needs_fetch(working_path: Path, remote: str = "origin") -> bool:
+    """ Return False if `git fetch --tags --prune <remote>` would not
+    change any ref in the given repo
+
+    Only local files are read, plus one `git ls-remote`, which is much
+    cheaper than a fetch.
+    """
+    try:
+        git_dir = tsrc.gitdir.find(working_path)
+        tsrc.gitdir.check_default_refspec(git_dir, remote)
+        remote_prefix = "refs/remotes/%s/" % remote
+        tracking_refs = git_dir.get_refs(remote_prefix)
+        local_tags = git_dir.get_refs("refs/tags/")
+    except tsrc.gitdir.Unsupported:
+        return True
+    try:
+        remote_refs = get_remote_refs(working_path, remote)
+    except GitError:
+        # Let the fetch report the error
+        return True
+
+    # refs/remotes/<remote>/HEAD is never pruned
+    tracking_refs.pop(remote_prefix + "HEAD", None)
+    for ref_name, sha1 in remote_refs.items():
+        if ref_name.startswith("refs/heads/"):
+            tracking_ref = remote_prefix + ref_name[len("refs/heads/"):]
+            if tracking_refs.pop(tracking_ref, None) != sha1:
+                return True
+        elif local_tags.pop(ref_name, None) != sha1:
+            return True
+    # Remaining tracking refs would be pruned
+    if tracking_refs:
+        return True
+    # Remaining tags too, but only if pruneTags is set: otherwise
+    # `--prune` leaves the tags fetched because of `--tags` alone
+    return bool(local_tags) and prunes_tags(working_path, remote)
+
+
+def prunes_tags(working_path: Path, remote: str) -> bool:
+    """ Return True if `git fetch --prune <remote>` also deletes the
+    local tags that no longer exist on the remote
+
+    """
+    # Read with git, since fetch.pruneTags is usually set globally
+    for key in ("remote.%s.pruneTags" % remote, "fetch.pruneTags"):
+        rc, value = run_git_captured(working_path, "config", "--bool", key, check=False)
+        if rc == 0:
+            return value == "true"
+    return False
+
+
+def head_is_upstream(working_path: Path) -> bool:
+    """ Return True if HEAD is on a branch that points to the same
+    commit as its upstream
+
+    """
+    try:
+        upstream_sha1 = tsrc.gitdir.get_upstream_sha1(working_path)
+        head_sha1 = tsrc.gitdir.get_head_sha1(working_path)
+    except tsrc.gitdir.Unsupported:
+        return False
+    return upstream_sha1 is not None and upstream_sha1 == head_sha1
+
+
 def is_shallow(working_path: Path) -> bool:
     root = get_repo_root(working_path)
     res = root.joinpath(".git/shallow").exists()  # type: bool
@@ -0,0 +1,328 @@
+""" Read git metadata straight from the .git directory
+
+Used by tsrc.git to answer simple questions (current branch, sha1 of
+HEAD, upstream of the current branch) without spawning git.
+
+Anything this module does not know how to read (reftable, config
+includes, custom fetch refspecs ...) raises Unsupported, and callers
+should then fall back to running git.
+
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple  # noqa
+
+from path import Path
+
+SHA1_RE = re.compile("^[0-9a-f]{40}([0-9a-f]{24})?$")
+SECTION_RE = re.compile(r'^\[([A-Za-z0-9.-]+)(?:\s+"((?:[^"\\]|\\.)*)")?\]$')
+KEY_RE = re.compile(r"^([A-Za-z][A-Za-z0-9-]*)\s*(?:=(.*))?$")
+MAX_SYMREF_DEPTH = 5
+
+ConfigKey = Tuple[str, str, str]  # (section, subsection, key)
+Config = Dict[ConfigKey, List[str]]
+
+
+class Unsupported(Exception):
+    pass
+
+
+class GitDir:
+    def __init__(self, git_dir: Path, common_dir: Path) -> None:
+        # For linked worktrees, HEAD lives in git_dir, but refs and
+        # config are shared with the main repo in common_dir
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+        self._packed_refs = None  # type: Optional[Dict[str, str]]
+        self._config = None  # type: Optional[Config]
+
+    def read_head(self) -> str:
+        return read_file(self.git_dir.joinpath("HEAD"))
+
+    def get_symbolic_head(self) -> Optional[str]:
+        """ Return the full name of the ref HEAD points to,
+        or None if HEAD is detached
+
+        """
+        head = self.read_head()
+        if head.startswith("ref: "):
+            ref_name = head[len("ref: "):]
+            if ref_name == "refs/heads/.invalid":
+                # HEAD of a repo using the reftable backend
+                raise Unsupported()
+            return ref_name
+        check_sha1(head)
+        return None
+
+    def resolve_ref(self, ref_name: str) -> Optional[str]:
+        """ Return the sha1 of the given ref, or None if it does not exist """
+        for _ in range(MAX_SYMREF_DEPTH):
+            loose_path = self.common_dir.joinpath(ref_name)
+            if not loose_path.isfile():
+                return self.get_packed_refs().get(ref_name)
+            contents = read_file(loose_path)
+            if contents.startswith("ref: "):
+                ref_name = contents[len("ref: "):]
+                continue
+            check_sha1(contents)
+            return contents
+        raise Unsupported()
+
+    def get_refs(self, prefix: str) -> Dict[str, str]:
+        """ Return the sha1 of every ref whose name starts with `prefix`,
+        like `git for-each-ref <prefix>` would
+
+        """
+        res = dict()  # type: Dict[str, str]
+        for ref_name, sha1 in self.get_packed_refs().items():
+            if ref_name.startswith(prefix):
+                res[ref_name] = sha1
+        loose_root = self.common_dir.joinpath(prefix)
+        if loose_root.isdir():
+            for loose_path in loose_root.walkfiles():
+                ref_name = self.common_dir.relpathto(loose_path).replace(os.sep, "/")
+                loose_sha1 = self.resolve_ref(ref_name)
+                if loose_sha1:
+                    res[ref_name] = loose_sha1
+        return res
+
+    def get_packed_refs(self) -> Dict[str, str]:
+        if self._packed_refs is None:
+            self._packed_refs = self._read_packed_refs()
+        return self._packed_refs
+
+    def _read_packed_refs(self) -> Dict[str, str]:
+        res = dict()  # type: Dict[str, str]
+        packed_refs_path = self.common_dir.joinpath("packed-refs")
+        if not packed_refs_path.exists():
+            return res
+        for line in read_file(packed_refs_path).splitlines():
+            # Skip the header and the peeled values of annotated tags
+            if not line or line.startswith(("#", "^")):
+                continue
+            sha1, _, ref_name = line.partition(" ")
+            check_sha1(sha1)
+            res[ref_name] = sha1
+        return res
+
+    def get_config(self) -> Config:
+        if self._config is None:
+            config_path = self.common_dir.joinpath("config")
+            config = parse_config(read_file(config_path))
+            if ("extensions", "", "refstorage") in config:
+                raise Unsupported()
+            self._config = config
+        return self._config
+
+    def get_config_value(self, section: str, subsection: str, key: str) -> Optional[str]:
+        values = self.get_config().get((section, subsection, key))
+        if not values:
+            return None
+        return values[-1]
+
+    def get_config_values(self, section: str, subsection: str, key: str) -> List[str]:
+        return self.get_config().get((section, subsection, key), list())
+
+
+def read_file(file_path: Path) -> str:
+    try:
+        res = file_path.text()  # type: str
+    except (OSError, UnicodeDecodeError):
+        raise Unsupported()
+    return res.strip()
+
+
+def check_sha1(value: str) -> None:
+    if not SHA1_RE.match(value):
+        raise Unsupported()
+
+
+def find(working_path: Path) -> GitDir:
+    """ Return the GitDir of the repository whose top-level
+    directory is `working_path`
+
+    """
+    dot_git = working_path.joinpath(".git")
+    if dot_git.isdir():
+        git_dir = dot_git
+    elif dot_git.isfile():
+        # Linked worktrees and submodules use a `gitdir: <path>` file
+        contents = read_file(dot_git)
+        if not contents.startswith("gitdir: "):
+            raise Unsupported()
+        git_dir = working_path.joinpath(contents[len("gitdir: "):])
+    else:
+        raise Unsupported()
+    common_dir = git_dir
+    commondir_path = git_dir.joinpath("commondir")
+    if commondir_path.exists():
+        common_dir = git_dir.joinpath(read_file(commondir_path))
+    return GitDir(git_dir.normpath(), common_dir.normpath())
+
+
+def parse_config(contents: str) -> Config:
+    """ Parse the subset of the git-config syntax found in .git/config files """
+    res = dict()  # type: Config
+    section = None  # type: Optional[Tuple[str, str]]
+    for line in contents.splitlines():
+        line = line.strip()
+        if not line or line.startswith(("#", ";")):
+            continue
+        if line.endswith("\\"):
+            # Continuation lines
+            raise Unsupported()
+        if line.startswith("["):
+            section = parse_section(line)
+            continue
+        match = KEY_RE.match(line)
+        if not match or not section:
+            raise Unsupported()
+        key, raw_value = match.groups()
+        value = "true" if raw_value is None else parse_value(raw_value)
+        config_key = (section[0], section[1], key.lower())
+        res.setdefault(config_key, list()).append(value)
+    return res
+
+
+def parse_section(line: str) -> Tuple[str, str]:
+    line = strip_comment(line)
+    match = SECTION_RE.match(line)
+    if not match:
+        raise Unsupported()
+    name, subsection = match.groups()
+    name = name.lower()
+    if name in ("include", "includeif"):
+        raise Unsupported()
+    if subsection is None:
+        # Deprecated [section.subsection] syntax
+        name, _, subsection = name.partition(".")
+    else:
+        subsection = re.sub(r"\\(.)", r"\1", subsection)
+    return (name, subsection)
+
+
+def strip_comment(line: str) -> str:
+    in_quotes = False
+    for i, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char in "#;" and not in_quotes:
+            return line[:i].strip()
+    return line
+
+
+def parse_value(raw_value: str) -> str:
+    escapes = {"n": "\n", "t": "\t", "b": "\b", "\\": "\\", '"': '"'}
+    res = ""
+    pending_spaces = ""
+    in_quotes = False
+    chars = iter(raw_value.strip())
+    for char in chars:
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == "\\":
+            escaped = next(chars, None)
+            if escaped not in escapes:
+                raise Unsupported()
+            res += pending_spaces + escapes[escaped]
+            pending_spaces = ""
+        elif char in "#;" and not in_quotes:
+            break
+        elif char.isspace() and not in_quotes:
+            pending_spaces += char
+        else:
+            res += pending_spaces + char
+            pending_spaces = ""
+    if in_quotes:
+        raise Unsupported()
+    return res
+
+
+def get_current_branch(working_path: Path) -> str:
+    """ Same as `git rev-parse --abbrev-ref HEAD`: return the
+    name of the current branch, or 'HEAD' if HEAD is detached
+
+    """
+    git_dir = find(working_path)
+    ref_name = git_dir.get_symbolic_head()
+    if ref_name is None:
+        return "HEAD"
+    if not ref_name.startswith("refs/heads/"):
+        raise Unsupported()
+    if git_dir.resolve_ref(ref_name) is None:
+        # Unborn branch: let git report the error
+        raise Unsupported()
+    return ref_name[len("refs/heads/"):]
+
+
+def get_head_sha1(working_path: Path) -> str:
+    """ Same as `git rev-parse HEAD` """
+    git_dir = find(working_path)
+    ref_name = git_dir.get_symbolic_head()
+    if ref_name is None:
+        return git_dir.read_head()
+    sha1 = git_dir.resolve_ref(ref_name)
+    if sha1 is None:
+        raise Unsupported()
+    return sha1
+
+
+def get_upstream(git_dir: GitDir) -> Optional[Tuple[str, str]]:
+    """ Return the full and the abbreviated name of the upstream
+    of the current branch, or None if there is no upstream
+
+    """
+    ref_name = git_dir.get_symbolic_head()
+    if ref_name is None or not ref_name.startswith("refs/heads/"):
+        return None
+    branch = ref_name[len("refs/heads/"):]
+    remote = git_dir.get_config_value("branch", branch, "remote")
+    merge = git_dir.get_config_value("branch", branch, "merge")
+    if not remote or not merge:
+        return None
+    if not merge.startswith("refs/heads/"):
+        raise Unsupported()
+    merge_branch = merge[len("refs/heads/"):]
+    if remote == ".":
+        upstream_ref = merge
+        res = merge_branch
+    else:
+        check_default_refspec(git_dir, remote)
+        res = "%s/%s" % (remote, merge_branch)
+        upstream_ref = "refs/remotes/" + res
+    if git_dir.resolve_ref(upstream_ref) is None:
+        return None
+    return (upstream_ref, res)
+
+
+def check_default_refspec(git_dir: GitDir, remote: str) -> None:
+    refspecs = git_dir.get_config_values("remote", remote, "fetch")
+    default_refspec = "+refs/heads/*:refs/remotes/%s/*" % remote
+    if refspecs != [default_refspec]:
+        raise Unsupported()
+
+
+def get_tracking_ref(working_path: Path) -> Optional[str]:
+    """ Same as `git rev-parse --abbrev-ref --symbolic-full-name @{u}`,
+    except that None is returned when there is no upstream
+
+    """
+    upstream = get_upstream(find(working_path))
+    if upstream is None:
+        return None
+    _, res = upstream
+    return res
+
+
+def get_upstream_sha1(working_path: Path) -> Optional[str]:
+    """ Same as `git rev-parse @{u}`, except that None is returned
+    when there is no upstream
+
+    """
+    git_dir = find(working_path)
+    upstream = get_upstream(git_dir)
+    if upstream is None:
+        return None
+    upstream_ref, _ = upstream
+    return git_dir.resolve_ref(upstream_ref)
@@ -1,10 +1,17 @@
 """ Support for finding elements inside a list of groups """
 
-from typing import Dict, Generic, Iterable, List, Optional, Set, TypeVar  # noqa
+import functools
+import re
+from typing import Any, Callable, Dict, Generic, Iterable, List, Optional, Set, TypeVar  # noqa
 import tsrc
 
 T = TypeVar('T')
 
+# Takes a GroupList, returns a bitset of its elements
+Evaluator = Callable[[Any], int]
+
+TOKEN_RE = re.compile(r"\s*(?:([()&|!-])|([^\s()&|!-][^\s()&|!]*))")
+
 
 class GroupError(tsrc.Error):
     pass
@@ -38,40 +45,197 @@ class UnknownElement(GroupError):
         super().__init__(message)
 
 
+class InvalidGroupExpression(GroupError):
+    def __init__(self, expression: str, details: str) -> None:
+        self.expression = expression
+        message = "Invalid group expression '%s': %s" % (expression, details)
+        super().__init__(message)
+
+
+class ExpressionParser:
+    """ Parse expressions like `(android | ios) - experimental`
+
+    From lowest to highest priority, the operators are:
+    `|` (union), `&` (intersection), `-` (difference) and `!` (complement).
+    Group names may contain dashes, so `-` must be preceded by a space.
+
+    """
+    def __init__(self, expression: str) -> None:
+        self.expression = expression
+        self.tokens = tokenize(expression)
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def next_token(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise InvalidGroupExpression(self.expression, "unexpected end")
+        self.position += 1
+        return token
+
+    def parse(self) -> Evaluator:
+        res = self.parse_union()
+        token = self.peek()
+        if token is not None:
+            raise InvalidGroupExpression(self.expression, "unexpected '%s'" % token)
+        return res
+
+    def parse_union(self) -> Evaluator:
+        res = self.parse_intersection()
+        while self.peek() == "|":
+            self.next_token()
+            res = combine("|", res, self.parse_intersection())
+        return res
+
+    def parse_intersection(self) -> Evaluator:
+        res = self.parse_difference()
+        while self.peek() == "&":
+            self.next_token()
+            res = combine("&", res, self.parse_difference())
+        return res
+
+    def parse_difference(self) -> Evaluator:
+        res = self.parse_unary()
+        while self.peek() == "-":
+            self.next_token()
+            res = combine("-", res, self.parse_unary())
+        return res
+
+    def parse_unary(self) -> Evaluator:
+        token = self.next_token()
+        if token == "!":
+            operand = self.parse_unary()
+            return lambda group_list: group_list.all_mask & ~operand(group_list)
+        if token == "(":
+            res = self.parse_union()
+            if self.next_token() != ")":
+                raise InvalidGroupExpression(self.expression, "expected ')'")
+            return res
+        if token in "|&-)":
+            raise InvalidGroupExpression(self.expression, "unexpected '%s'" % token)
+        return lambda group_list: group_list.get_closure_mask(token)
+
+
+def tokenize(expression: str) -> List[str]:
+    res = list()
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_RE.match(expression, position)
+        if not match:
+            raise InvalidGroupExpression(expression, "could not parse")
+        res.append(match.group(1) or match.group(2))
+        position = match.end()
+    return res
+
+
+def combine(operator: str, left: Evaluator, right: Evaluator) -> Evaluator:
+    if operator == "|":
+        return lambda group_list: left(group_list) | right(group_list)
+    if operator == "&":
+        return lambda group_list: left(group_list) & right(group_list)
+    return lambda group_list: left(group_list) & ~right(group_list)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_expression(expression: str) -> Evaluator:
+    return ExpressionParser(expression).parse()
+
+
 class GroupList(Generic[T]):
     def __init__(self, *, elements: Iterable[T]) -> None:
         self.groups = dict()  # type: Dict[str, Group]
         self.all_elements = elements
-        self._groups_seen = set()  # type: Set[str]
+        # Sets of elements are stored as bitsets over these indexes
+        self._elements = list(elements)  # type: List[T]
+        self._indexes = {x: i for (i, x) in enumerate(self._elements)}  # type: Dict[T, int]
+        # Transitive closure of each group, computed on demand
+        self._closures = dict()  # type: Dict[str, int]
 
     def add(self, name: str, elements: Iterable[T],
             includes: Optional[List[str]] = None) -> None:
         for element in elements:
-            if element not in self.all_elements:
+            if element not in self._indexes:
                 raise UnknownElement(name, element)
         self.groups[name] = Group(name, elements, includes=includes)
+        self._closures = dict()
 
     def get_group(self, name: str) -> Optional[Group]:
         return self.groups.get(name)
 
     def get_elements(self, groups: Optional[List[str]] = None) -> Iterable[T]:
-        self._groups_seen = set()
-        res = set()  # type: Set[T]
         if not groups:
             return self.all_elements
-        self._rec_get_elements(res, groups, parent_group=None)
-        return res
-
-    def _rec_get_elements(self, res: Set[T],
-                          group_names: List[str], *,
-                          parent_group: Optional[Group]) -> None:
-        for group_name in group_names:
-            if group_name in self._groups_seen:
-                return
+        mask = 0
+        for expression in groups:
+            evaluator = compile_expression(expression)
+            mask |= evaluator(self)
+        return self.elements_from_mask(mask)
+
+    @property
+    def all_mask(self) -> int:
+        return (1 << len(self._elements)) - 1
+
+    def get_closure_mask(self, group_name: str) -> int:
+        """ Return the bitset of the elements of the group and of all the
+        groups it includes, directly or not
+
+        """
+        if group_name not in self._closures:
+            self._compute_closures(group_name)
+        return self._closures[group_name]
+
+    def elements_from_mask(self, mask: int) -> Set[T]:
+        # bin() starts with '0b' and lists the most significant bit first
+        bits = bin(mask)[:1:-1]
+        return {self._elements[i] for (i, bit) in enumerate(bits) if bit == "1"}
+
+    def _compute_closures(self, root_name: str) -> None:
+        # Tarjan's algorithm: groups that include each other, directly
+        # or not, form a strongly connected component and share the
+        # same closure, so cycles are computed only once.
+        indexes = dict()  # type: Dict[str, int]
+        lowlinks = dict()  # type: Dict[str, int]
+        stack = list()  # type: List[str]
+        on_stack = set()  # type: Set[str]
+
+        def visit(group_name: str, parent_group: Optional[Group]) -> None:
             if group_name not in self.groups:
                 raise GroupNotFound(group_name, parent_group=parent_group)
             group = self.groups[group_name]
-            for element in group.elements:
-                res.add(element)
-            self._groups_seen.add(group.name)
-            self._rec_get_elements(res, group.includes, parent_group=group)
+            indexes[group_name] = lowlinks[group_name] = len(indexes)
+            stack.append(group_name)
+            on_stack.add(group_name)
+            for include in group.includes:
+                if include in self._closures:
+                    continue
+                if include not in indexes:
+                    visit(include, group)
+                    lowlinks[group_name] = min(lowlinks[group_name], lowlinks[include])
+                elif include in on_stack:
+                    lowlinks[group_name] = min(lowlinks[group_name], indexes[include])
+            if lowlinks[group_name] != indexes[group_name]:
+                return
+            members = list()  # type: List[str]
+            while group_name not in members:
+                member = stack.pop()
+                on_stack.remove(member)
+                members.append(member)
+            self._store_closure(members)
+
+        visit(root_name, None)
+
+    def _store_closure(self, members: List[str]) -> None:
+        closure = 0
+        for member in members:
+            for element in self.groups[member].elements:
+                closure |= 1 << self._indexes[element]
+            for include in self.groups[member].includes:
+                # Includes outside of the component are already computed
+                closure |= self._closures.get(include, 0)
+        for member in members:
+            self._closures[member] = closure
@@ -0,0 +1,87 @@
+""" On-disk journal of the items processed by the executor
+
+Used by `tsrc sync --resume` and `tsrc sync --retry-failed` to skip
+the work already done by a previous, interrupted or failed run.
+
+The journal is a JSON-lines file: each line records the outcome
+of one item of one task, so that if tsrc is killed while writing
+to it, only the last line is lost.
+
+"""
+
+import json
+from typing import Dict, TextIO  # noqa
+
+from path import Path
+
+OK = "ok"
+FAILED = "failed"
+
+# Which items of a task to process again
+ALL = "all"
+RESUME = "resume"
+RETRY_FAILED = "retry-failed"
+
+
+class Journal:
+    def __init__(self, path: Path, mode: str = ALL) -> None:
+        self.path = path
+        self.mode = mode
+        # task name -> item key -> outcome of the previous run
+        self.previous = dict()  # type: Dict[str, Dict[str, str]]
+
+    def start(self) -> None:
+        """ Read the journal of the previous run, if needed, then
+        start a new one
+
+        """
+        if self.mode != ALL:
+            self.previous = self.read()
+        self.path.parent.makedirs_p()
+        # The new journal starts with what was already done, so that
+        # the run can be resumed again if it is interrupted too
+        with open(self.path, "w") as fp:
+            for task_name, outcomes in self.previous.items():
+                for item_key, outcome in outcomes.items():
+                    if outcome == OK:
+                        write_entry(fp, task_name, item_key, outcome)
+
+    def read(self) -> Dict[str, Dict[str, str]]:
+        res = dict()  # type: Dict[str, Dict[str, str]]
+        if not self.path.exists():
+            return res
+        for line in self.path.lines(retain=False):
+            try:
+                entry = json.loads(line)
+                task_name, item_key, outcome = entry["task"], entry["item"], entry["outcome"]
+            except (ValueError, KeyError, TypeError):
+                # Last line of a journal whose writing was interrupted
+                continue
+            res.setdefault(task_name, dict())[item_key] = outcome
+        return res
+
+    def should_skip(self, task_name: str, item_key: str) -> bool:
+        if self.mode == ALL:
+            return False
+        outcomes = self.previous.get(task_name)
+        if outcomes is None:
+            # The previous run did not get that far
+            return False
+        outcome = outcomes.get(item_key)
+        if self.mode == RESUME:
+            return outcome == OK
+        return outcome != FAILED
+
+    def record(self, task_name: str, item_key: str, ok: bool) -> None:
+        outcome = OK if ok else FAILED
+        with open(self.path, "a") as fp:
+            write_entry(fp, task_name, item_key, outcome)
+
+    def finish(self) -> None:
+        """ Called when the run succeeded: nothing is left to resume """
+        self.path.remove_p()
+
+
+def write_entry(fp: TextIO, task_name: str, item_key: str, outcome: str) -> None:
+    entry = {"task": task_name, "item": item_key, "outcome": outcome}
+    fp.write(json.dumps(entry) + "\n")
@@ -1,11 +1,14 @@
 """ manifests for tsrc """
 
+import hashlib
 import operator
 import os
+import pickle
 from typing import cast, Any, Dict, List, NewType, Optional, Tuple # noqa
 
 from path import Path
 import schema
+import ui
 
 import tsrc
 import tsrc.config
@@ -18,6 +21,13 @@ RepoConfig = NewType('RepoConfig', Dict[str, Any])
 
 GitLabConfig = NewType('GitLabConfig', Dict[str, Any])
 
+# Bump this whenever the pickled classes (Manifest, Repo, GroupList ...) change,
+# so that existing manifest caches get discarded
+CACHE_VERSION = 6
+
+
+CacheEntry = Tuple[int, str, "Manifest"]
+
 
 class RepoNotFound(tsrc.Error):
     def __init__(self, src: str) -> None:
@@ -27,6 +37,8 @@ class RepoNotFound(tsrc.Error):
 class Manifest():
     def __init__(self) -> None:
         self._repos = list()  # type: List[Repo]
+        self._repos_by_src = dict()  # type: Dict[str, Repo]
+        self._repos_by_url = dict()  # type: Dict[str, List[Repo]]
         self.copyfiles = list()  # type: List[Tuple[str, str]]
         self.gitlab = None  # type: Optional[GitLabConfig]
         self.group_list = None  # type:  Optional[GroupList[str]]
@@ -41,9 +53,17 @@ class Manifest():
             branch = repo_config.get("branch", "master")
             tag = repo_config.get("tag")
             sha1 = repo_config.get("sha1")
+            clone_filter = repo_config.get("clone_filter")
+            bundle = repo_config.get("bundle")
+            sparse = repo_config.get("sparse")
+            if sparse:
+                sparse = tuple(sparse)
             repo = tsrc.Repo(url=url, src=src, branch=branch,
-                             sha1=sha1, tag=tag)
+                             sha1=sha1, tag=tag, clone_filter=clone_filter,
+                             bundle=bundle, sparse=sparse)
             self._repos.append(repo)
+            self._repos_by_src.setdefault(src, repo)
+            self._repos_by_url.setdefault(url, list()).append(repo)
 
             self._handle_copies(repo_config)
 
@@ -60,7 +80,7 @@ class Manifest():
             self.copyfiles.append((src_copy, dest_copy))
 
     def _handle_groups(self, config: ManifestConfig) -> None:
-        elements = set(repo.src for repo in self._repos)
+        elements = set(self._repos_by_src)
         self.group_list = tsrc.groups.GroupList(elements=elements)
         groups_config = config.get("groups", dict())
         for name, group_config in groups_config.items():
@@ -87,9 +107,7 @@ class Manifest():
     def _get_repos_in_groups(self, groups: List[str]) -> List[tsrc.Repo]:
         assert self.group_list
         elements = self.group_list.get_elements(groups=groups)
-        res = list()
-        for src in elements:
-            res.append(self.get_repo(src))
+        res = [self._repos_by_src[src] for src in elements]
         return sorted(res, key=operator.attrgetter("src"))
 
     def get_url(self, src: str) -> str:
@@ -97,13 +115,65 @@ class Manifest():
         return repo.url
 
     def get_repo(self, src: str) -> tsrc.Repo:
-        for repo in self._repos:
-            if repo.src == src:
-                return repo
-        raise RepoNotFound(src)
+        repo = self._repos_by_src.get(src)
+        if not repo:
+            raise RepoNotFound(src)
+        return repo
+
+    def get_repos_by_url(self, url: str) -> List[tsrc.Repo]:
+        """ Return the repos cloned from the given URL, if any """
+        return list(self._repos_by_url.get(url, list()))
+
+
+def load(manifest_path: Path, cache_dir: Optional[Path] = None) -> Manifest:
+    """ Load the manifest from the given YAML file
+
+    If `cache_dir` is set, the resolved Manifest is pickled there, and
+    re-used as long as the contents of the YAML file do not change.
+
+    """
+    if not cache_dir:
+        return parse(manifest_path)
+    try:
+        contents = manifest_path.bytes()
+    except OSError:
+        # Let parse() raise InvalidConfig
+        return parse(manifest_path)
+    digest = hashlib.sha256(contents).hexdigest()
+    cache_path = cache_dir.joinpath("manifest.pickle")
+    cached = read_cache(cache_path)
+    if cached and cached[0] == CACHE_VERSION and cached[1] == digest:
+        return cached[2]
+    res = parse(manifest_path)
+    write_cache(cache_path, (CACHE_VERSION, digest, res))
+    return res
+
+
+def read_cache(cache_path: Path) -> Optional[CacheEntry]:
+    try:
+        with cache_path.open("rb") as fp:
+            res = pickle.load(fp)
+    except Exception:
+        # Missing, truncated or written by an other version of tsrc
+        return None
+    if not isinstance(res, tuple) or len(res) != 3:
+        return None
+    return cast(CacheEntry, res)
+
+
+def write_cache(cache_path: Path, entry: CacheEntry) -> None:
+    try:
+        cache_path.parent.makedirs_p()
+        tmp_path = cache_path.parent.joinpath("%s.%d.tmp" % (cache_path.name, os.getpid()))
+        with tmp_path.open("wb") as fp:
+            pickle.dump(entry, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        # Atomic, so that concurrent tsrc processes never read a partial cache
+        os.replace(tmp_path, cache_path)
+    except OSError as error:
+        ui.debug("Could not write manifest cache:", error)
 
 
-def load(manifest_path: Path) -> Manifest:
+def parse(manifest_path: Path) -> Manifest:
     gitlab_schema = {"url": str}
     copy_schema = {"src": str, schema.Optional("dest"): str}
     repo_schema = {
@@ -113,6 +183,9 @@ def load(manifest_path: Path) -> Manifest:
         schema.Optional("copy"): [copy_schema],
         schema.Optional("sha1"): str,
         schema.Optional("tag"): str,
+        schema.Optional("clone_filter"): str,
+        schema.Optional("bundle"): str,
+        schema.Optional("sparse"): [str],
     }
     group_schema = {
         "repos": [str],
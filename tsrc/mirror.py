@@ -0,0 +1,131 @@
+""" Machine-wide cache of bare mirrors, shared by all the workspaces
+
+Configured in tsrc.yml, like so:
+
+    mirrors:
+      path: ~/.cache/tsrc/mirrors
+      dissociate: false
+
+New clones borrow objects from the mirrors with `git clone --reference-if-able`,
+so that only the objects missing from the mirror are fetched from the remote.
+
+"""
+
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Set  # noqa
+
+from path import Path
+import ui
+
+import tsrc
+import tsrc.config
+import tsrc.git
+
+
+class MirrorCache:
+    def __init__(self, root_path: Path, *, dissociate: bool = False) -> None:
+        self.root_path = root_path
+        self.dissociate = dissociate
+        self._lock = threading.Lock()
+        # Held while the mirror of an URL is created or refreshed, so that
+        # parallel clones of the same URL wait for it
+        self._url_locks = dict()  # type: Dict[str, threading.Lock]
+        # Mirrors already created or refreshed by this process
+        self._up_to_date = set()  # type: Set[str]
+
+    def get_path(self, url: str) -> Path:
+        """ Return the path of the bare mirror for the given URL """
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+        name = url.rstrip("/").split("/")[-1].split(":")[-1]
+        if name.endswith(".git"):
+            name = name[:-4]
+        name = re.sub(r"[^A-Za-z0-9._-]", "_", name)
+        return self.root_path.joinpath("%s-%s.git" % (name, digest))
+
+    def get_clone_args(self, url: str) -> List[str]:
+        """ Create or refresh the mirror of `url`, and return the
+        arguments to pass to `git clone` to use it
+
+        """
+        try:
+            self.update(url, create=True)
+        except tsrc.Error as error:
+            ui.warning("Could not update mirror of", url, "-", error)
+            return list()
+        res = ["--reference-if-able", str(self.get_path(url))]
+        if self.dissociate:
+            res.append("--dissociate")
+        return res
+
+    def refresh(self, url: str) -> None:
+        """ Fetch new objects into the mirror of `url`, if there is one """
+        try:
+            self.update(url, create=False)
+        except tsrc.Error as error:
+            ui.warning("Could not update mirror of", url, "-", error)
+
+    def get_url_lock(self, url: str) -> threading.Lock:
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def update(self, url: str, *, create: bool) -> None:
+        with self.get_url_lock(url):
+            if url in self._up_to_date:
+                return
+            mirror_path = self.get_path(url)
+            if mirror_path.exists():
+                ui.info_2("Updating mirror", mirror_path)
+                # No --prune: workspaces may still need objects from deleted refs
+                tsrc.git.run_git(mirror_path, "fetch", "--tags", "origin")
+            elif create:
+                self.create(url, mirror_path)
+            else:
+                return
+            # Only once it succeeded, so that it is tried again otherwise
+            self._up_to_date.add(url)
+
+    def create(self, url: str, mirror_path: Path) -> None:
+        ui.info_2("Creating mirror", mirror_path)
+        self.root_path.makedirs_p()
+        # Clone next to the final location, then rename, so that concurrent
+        # tsrc processes never see a partial mirror
+        tmp_name = "%s.tmp-%d-%d" % (mirror_path.name, os.getpid(), threading.get_ident())
+        tmp_path = self.root_path.joinpath(tmp_name)
+        try:
+            tsrc.git.run_git(self.root_path, "clone", "--mirror", url, tmp_name)
+            # Clones borrow objects from the mirror: never let gc delete
+            # objects that became unreachable in the mirror, as they may
+            # still be used by the clones
+            tsrc.git.run_git(tmp_path, "config", "gc.pruneExpire", "never")
+            tsrc.git.run_git(tmp_path, "config", "gc.auto", "0")
+            os.rename(tmp_path, mirror_path)
+        except OSError:
+            # Someone else created the mirror in the mean time
+            pass
+        finally:
+            if tmp_path.exists():
+                tmp_path.rmtree_p()
+
+
+def from_tsrc_config() -> Optional[MirrorCache]:
+    """ Return the MirrorCache configured in tsrc.yml, if any
+
+    Mirrors are only an optimization: if tsrc.yml cannot be parsed,
+    they are disabled with a warning.
+    """
+    cfg_path = tsrc.config.get_tsrc_config_path()
+    if not cfg_path.exists():
+        return None
+    try:
+        mirrors_config = tsrc.config.parse_mirrors_config(config_path=cfg_path)
+    except tsrc.InvalidConfig as error:
+        ui.warning(error, "- not using mirrors")
+        return None
+    if not mirrors_config:
+        return None
+    root_path = Path(mirrors_config["path"]).expanduser()
+    dissociate = mirrors_config.get("dissociate", False)
+    return MirrorCache(root_path, dissociate=dissociate)
@@ -0,0 +1,79 @@
+""" Capture what is written while an item is processed on a worker
+thread, so that it can be displayed in one block once the item is done
+
+Messages from the ui module are captured by replacing sys.stdout and
+sys.stderr with ThreadOutput objects, which write to the buffer of the
+current thread, if any. tsrc.git.run_git() captures the output of git
+itself when get_buffer() is not None.
+
+"""
+
+import contextlib
+import io
+import sys
+import threading
+from typing import Any, Iterator, Optional, TextIO  # noqa
+
+_LOCAL = threading.local()
+
+
+def get_buffer() -> Optional[io.StringIO]:
+    res = getattr(_LOCAL, "buffer", None)  # type: Optional[io.StringIO]
+    return res
+
+
+@contextlib.contextmanager
+def capture() -> Iterator[io.StringIO]:
+    """ Capture the output of the current thread into a buffer """
+    buffer = io.StringIO()
+    _LOCAL.buffer = buffer
+    try:
+        yield buffer
+    except BaseException:
+        # Typically SystemExit from ui.fatal(): do not lose the message
+        _LOCAL.buffer = None
+        sys.stdout.write(buffer.getvalue())
+        raise
+    finally:
+        _LOCAL.buffer = None
+
+
+class ThreadOutput:
+    """ Write to the buffer of the current thread if it has one,
+    or to `stream` otherwise
+
+    """
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        buffer = get_buffer()
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    def flush(self) -> None:
+        if get_buffer() is None:
+            self.stream.flush()
+
+    def isatty(self) -> bool:
+        # So that captured messages keep their colors
+        return self.stream.isatty()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stream, name)
+
+
+@contextlib.contextmanager
+def redirect() -> Iterator[None]:
+    """ Let the threads capture what they write to stdout and stderr
+    for the duration of the `with` statement
+
+    """
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = ThreadOutput(stdout)
+    sys.stderr = ThreadOutput(stderr)
+    try:
+        yield
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
@@ -1,7 +1,7 @@
 """ Repo value object """
 
 import attr
-from typing import Optional  # noqa
+from typing import Optional, Tuple  # noqa
 
 
 @attr.s(frozen=True)
@@ -12,3 +12,6 @@ class Repo():
     sha1 = attr.ib(default=None)  # type: Optional[str]
     tag = attr.ib(default=None)   # type: Optional[str]
     shallow = attr.ib(default=None)  # type: Optional[bool]
+    clone_filter = attr.ib(default=None)  # type: Optional[str]
+    bundle = attr.ib(default=None)  # type: Optional[str]
+    sparse = attr.ib(default=None)  # type: Optional[Tuple[str, ...]]
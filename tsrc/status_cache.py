@@ -0,0 +1,119 @@
+""" Cache of the parts of `tsrc status` that only depend on refs
+
+`git status` has to run every time, because editing a file in the
+worktree does not touch anything in .git. But the tags pointing at
+HEAD only change when HEAD or the tags change, so the result of
+`git tag --points-at HEAD` is stored in <workspace>/.tsrc/status-cache,
+along with a signature made of:
+
+* the sha1 of HEAD
+* the mtime and size of packed-refs
+* the mtime of each directory below refs/tags, which changes whenever
+  a loose tag is created, moved or deleted
+
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple  # noqa
+
+from path import Path
+
+import tsrc.git
+import tsrc.gitdir
+
+CACHE_VERSION = 1
+# Do not cache results when the refs changed less than that many
+# nanoseconds ago: on file systems with a coarse mtime resolution, a
+# later change could leave the signature unchanged
+RACY_DELAY_NS = 2 * 10 ** 9
+
+Signature = List[Any]
+
+
+def get_signature(working_path: Path) -> Tuple[Signature, int]:
+    """ Return the signature, and the most recent mtime it contains
+
+    Raise tsrc.gitdir.Unsupported if the signature cannot be computed
+    without running git
+    """
+    git_dir = tsrc.gitdir.find(working_path)
+    res = [tsrc.gitdir.get_head_sha1(working_path)]  # type: Signature
+    newest_mtime = 0
+    packed_refs_path = git_dir.common_dir.joinpath("packed-refs")
+    try:
+        stat = packed_refs_path.stat()
+        res.append([stat.st_mtime_ns, stat.st_size])
+        newest_mtime = stat.st_mtime_ns
+    except FileNotFoundError:
+        res.append(None)
+    tags_path = git_dir.common_dir.joinpath("refs", "tags")
+    if tags_path.isdir():
+        tag_dirs = [tags_path] + sorted(tags_path.walkdirs())
+        for tag_dir in tag_dirs:
+            mtime = tag_dir.stat().st_mtime_ns
+            res.append([tags_path.relpathto(tag_dir), mtime])
+            newest_mtime = max(newest_mtime, mtime)
+    return res, newest_mtime
+
+
+class StatusCache:
+    def __init__(self, cache_path: Path) -> None:
+        self.cache_path = cache_path
+        # src -> {"signature": ..., "tag": ...}
+        self.entries = dict()  # type: Dict[str, Dict[str, Any]]
+        self.changed = False
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        try:
+            contents = json.loads(self.cache_path.text())
+        except (OSError, ValueError):
+            return
+        if not isinstance(contents, dict) or contents.get("version") != CACHE_VERSION:
+            return
+        self.entries = contents.get("repos", dict())
+
+    def save(self) -> None:
+        if not self.changed:
+            return
+        self.cache_path.parent.makedirs_p()
+        tmp_path = self.cache_path.parent.joinpath(self.cache_path.name + ".tmp")
+        contents = {"version": CACHE_VERSION, "repos": self.entries}
+        try:
+            tmp_path.write_text(json.dumps(contents))
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # The cache is only an optimization
+            tmp_path.remove_p()
+
+    def get_tag(self, src: str, working_path: Path) -> Optional[str]:
+        """ Same as tsrc.git.get_current_tag(), but only runs git
+        if HEAD or the tags changed since the last call
+
+        """
+        try:
+            signature, newest_mtime = get_signature(working_path)
+        except (tsrc.gitdir.Unsupported, OSError):
+            return get_current_tag(working_path)
+        with self._lock:
+            entry = self.entries.get(src)
+        if entry and entry["signature"] == signature:
+            res = entry["tag"]  # type: Optional[str]
+            return res
+        res = get_current_tag(working_path)
+        if int(time.time() * 1e9) - newest_mtime < RACY_DELAY_NS:
+            return res
+        with self._lock:
+            self.entries[src] = {"signature": signature, "tag": res}
+            self.changed = True
+        return res
+
+
+def get_current_tag(working_path: Path) -> Optional[str]:
+    try:
+        return tsrc.git.get_current_tag(working_path)
+    except tsrc.git.GitError:
+        return None
@@ -0,0 +1,92 @@
+from typing import Any
+
+from path import Path
+
+import tsrc.git
+import tsrc.workspace
+
+from ui.tests.conftest import message_recorder
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+def get_origin_url(repo_path: Path) -> str:
+    _, out = tsrc.git.run_git_captured(repo_path, "remote", "get-url", "origin")
+    return out
+
+
+def test_create_and_clone_from_bundles(tsrc_cli: CLI, git_server: GitServer,
+                                       tmp_path: Path, workspace_path: Path) -> None:
+    foo_url = git_server.add_repo("foo/bar")
+    git_server.push_file("foo/bar", "one.txt")
+    tsrc_cli.run("init", git_server.manifest_url)
+    bundles_path = tmp_path.joinpath("bundles")
+
+    tsrc_cli.run("bundle", "create", "--output", str(bundles_path))
+
+    assert bundles_path.joinpath("foo/bar.bundle").exists()
+
+    git_server.push_file("foo/bar", "two.txt")
+    other_path = tmp_path.joinpath("other")
+    tsrc_cli.run("init", "-w", str(other_path), "--bundles", str(bundles_path),
+                 git_server.manifest_url)
+
+    bar_path = other_path.joinpath("foo/bar")
+    assert get_origin_url(bar_path) == foo_url
+    assert bar_path.joinpath("two.txt").exists()
+
+
+def test_bundles_path_relative_to_working_dir(tsrc_cli: CLI, git_server: GitServer,
+                                              tmp_path: Path, workspace_path: Path,
+                                              monkeypatch: Any) -> None:
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("bundle", "create", "--output", str(tmp_path.joinpath("bundles")))
+    other_path = tmp_path.joinpath("other")
+    monkeypatch.chdir(tmp_path)
+
+    tsrc_cli.run("init", "-w", str(other_path), "--bundles", "bundles",
+                 git_server.manifest_url)
+
+    cfg_path = other_path.joinpath(".tsrc/manifest.yml")
+    options = tsrc.workspace.options_from_file(cfg_path)
+    assert options.bundles == tmp_path.joinpath("bundles")
+    assert other_path.joinpath("foo/README").exists()
+
+
+def test_missing_bundles_path(tsrc_cli: CLI, git_server: GitServer, tmp_path: Path,
+                              workspace_path: Path, message_recorder: message_recorder) -> None:
+    git_server.add_repo("foo")
+
+    tsrc_cli.run("init", "--bundles", str(tmp_path.joinpath("nope")), git_server.manifest_url)
+
+    assert message_recorder.find("Bundles directory .* does not exist")
+    assert workspace_path.joinpath("foo/README").exists()
+
+
+def test_bundle_in_manifest(tsrc_cli: CLI, git_server: GitServer,
+                            tmp_path: Path, workspace_path: Path) -> None:
+    foo_url = git_server.add_repo("foo")
+    bundle_path = tmp_path.joinpath("foo.bundle")
+    tsrc.git.run_git(git_server.get_path("foo"), "bundle", "create", bundle_path, "--all")
+    git_server.manifest.configure_repo("foo", "bundle", str(bundle_path))
+    git_server.push_file("foo", "new.txt")
+
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    foo_path = workspace_path.joinpath("foo")
+    assert get_origin_url(foo_path) == foo_url
+    assert foo_path.joinpath("new.txt").exists()
+
+
+def test_invalid_bundle(tsrc_cli: CLI, git_server: GitServer, tmp_path: Path,
+                        workspace_path: Path, message_recorder: message_recorder) -> None:
+    git_server.add_repo("foo")
+    bundle_path = tmp_path.joinpath("foo.bundle")
+    bundle_path.write_text("this is not a bundle")
+    git_server.manifest.configure_repo("foo", "bundle", str(bundle_path))
+
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    assert message_recorder.find("Could not clone from")
+    assert workspace_path.joinpath("foo/README").exists()
@@ -1,5 +1,8 @@
+import json
 import os
-from typing import List
+from typing import Any, List
+
+import pytest
 
 from tsrc.test.helpers.cli import CLI
 from tsrc.test.helpers.git_server import GitServer
@@ -77,3 +80,73 @@ def test_foreach_shell(
     cmd.append("doc")
     tsrc_cli.run("foreach", "-c", " ".join(cmd))
     assert message_recorder.find("`%s`" % " ".join(cmd))
+
+
+@pytest.mark.skipif(os.name == "nt", reason="uses a POSIX shell")
+def test_foreach_parallel_output_is_not_interleaved(
+        tsrc_cli: CLI, git_server: GitServer, capfd: Any) -> None:
+    names = ["repo-%d" % i for i in range(6)]
+    git_server.add_repos(names)
+    tsrc_cli.run("init", git_server.manifest_url)
+    capfd.readouterr()
+
+    script = "echo start $(basename $PWD); sleep 0.1; echo end $(basename $PWD) >&2"
+    tsrc_cli.run("foreach", "-j", "6", "-c", script)
+
+    out, _ = capfd.readouterr()
+    lines = [line for line in out.splitlines() if line.startswith(("start", "end"))]
+    assert len(lines) == 12
+    for start_line, end_line in zip(lines[::2], lines[1::2]):
+        assert start_line.replace("start", "end") == end_line
+
+
+@pytest.mark.skipif(os.name == "nt", reason="uses a POSIX shell")
+def test_foreach_parallel_with_errors(
+        tsrc_cli: CLI, git_server: GitServer,
+        message_recorder: message_recorder) -> None:
+    git_server.add_repos(["foo", "spam", "eggs"])
+    git_server.push_file("spam", "bad")
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    tsrc_cli.run("foreach", "-j", "3", "-c", "test ! -e bad", expect_fail=True)
+
+    assert message_recorder.find(r"\* spam: command exited with code 1")
+    assert not message_recorder.find(r"\* foo")
+
+
+@pytest.mark.skipif(os.name == "nt", reason="uses a POSIX shell")
+def test_foreach_prefixed_output(
+        tsrc_cli: CLI, git_server: GitServer, capfd: Any,
+        message_recorder: message_recorder) -> None:
+    git_server.add_repos(["foo", "spam/eggs", "bar"])
+    tsrc_cli.run("init", git_server.manifest_url)
+    capfd.readouterr()
+
+    script = "echo one; sleep 0.1; printf two; test $(basename $PWD) != bar"
+    tsrc_cli.run("foreach", "-j", "2", "--output=prefix", "-c", script, expect_fail=True)
+
+    out, _ = capfd.readouterr()
+    for src in ["foo", "spam/eggs", "bar"]:
+        prefix = ("[%s]" % src).ljust(len("[spam/eggs]")) + " "
+        assert prefix + "one\n" in out
+        assert prefix + "two\n" in out
+    assert message_recorder.find(r"\* bar: command exited with code 1")
+    assert not message_recorder.find(r"\* foo")
+
+
+@pytest.mark.skipif(os.name == "nt", reason="uses a POSIX shell")
+def test_foreach_json(tsrc_cli: CLI, git_server: GitServer, capfd: Any) -> None:
+    git_server.add_repos(["foo", "bar"])
+    tsrc_cli.run("init", git_server.manifest_url)
+    capfd.readouterr()
+
+    script = "echo hello; test $(basename $PWD) != bar"
+    tsrc_cli.run("foreach", "-j", "2", "--format=json", "-c", script, expect_fail=True)
+
+    out, _ = capfd.readouterr()
+    objects = {x["src"]: x for x in (json.loads(line) for line in out.splitlines())}
+    assert objects["foo"]["rc"] == 0
+    assert objects["foo"]["output"] == "hello\n"
+    assert objects["foo"]["cmd"] == script
+    assert objects["bar"]["rc"] == 1
+    assert objects["bar"]["duration"] >= 0
@@ -38,6 +38,21 @@ def test_init_with_args(tsrc_cli: CLI, git_server: GitServer, monkeypatch: Any,
     assert_cloned(work2_path, "foo")
 
 
+def test_init_nested_repos_in_parallel(tsrc_cli: CLI, git_server: GitServer,
+                                       workspace_path: Path) -> None:
+    """ Check that the nested repos are only cloned once the repo
+    containing them is there
+
+    """
+    git_server.add_repo("foo")
+    for i in range(8):
+        git_server.add_repo("foo/sub%i" % i)
+    tsrc_cli.run("init", "-j", "8", git_server.manifest_url)
+    assert_cloned(workspace_path, "foo")
+    for i in range(8):
+        assert_cloned(workspace_path, "foo/sub%i" % i)
+
+
 def test_init_twice(tsrc_cli: CLI, git_server: GitServer) -> None:
     manifest_url = git_server.manifest_url
     tsrc_cli.run("init", manifest_url)
@@ -1,3 +1,12 @@
+import json
+import os
+import sys
+from typing import Any
+
+from path import Path
+import pytest
+
+import tsrc.git
 from tsrc.test.helpers.cli import CLI
 from tsrc.test.helpers.git_server import GitServer
 from ui.tests.conftest import message_recorder
@@ -30,3 +39,121 @@ def test_error(tsrc_cli: CLI, git_server: GitServer) -> None:
     tsrc_cli.run("init", manifest_url)
 
     tsrc_cli.run("log", "--from", "v0.1", expect_fail=True)
+
+
+def test_json(tsrc_cli: CLI, git_server: GitServer, capfd: Any) -> None:
+    git_server.add_repos(["foo", "spam"])
+    git_server.tag("foo", "v0.1")
+    git_server.tag("spam", "v0.1")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "foo.txt", message="new foo!")
+    tsrc_cli.run("sync")
+    capfd.readouterr()
+
+    tsrc_cli.run("log", "--from", "v0.1", "--format=json")
+
+    out, _ = capfd.readouterr()
+    foo, spam = [json.loads(line) for line in out.splitlines()]
+    assert foo["src"] == "foo"
+    assert foo["rc"] == 0
+    (commit,) = foo["commits"]
+    assert commit["subject"] == "new foo!"
+    assert isinstance(commit["commit_date"], int)
+    assert len(commit["sha1"]) == 40
+    assert spam == {"src": "spam", "rc": 0, "commits": [], "error": None}
+
+
+def push_file_at(git_server: GitServer, monkeypatch: Any, name: str,
+                 timestamp: int, message: str) -> None:
+    monkeypatch.setenv("GIT_COMMITTER_DATE", "%d +0000" % timestamp)
+    git_server.push_file(name, message + ".txt", message=message)
+
+
+def test_merged(tsrc_cli: CLI, git_server: GitServer, capfd: Any, monkeypatch: Any) -> None:
+    git_server.add_repos(["foo", "spam", "eggs"])
+    for name in ["foo", "spam", "eggs"]:
+        git_server.tag(name, "v0.1")
+    push_file_at(git_server, monkeypatch, "foo", 1500000000, "first foo")
+    push_file_at(git_server, monkeypatch, "spam", 1500001000, "spam")
+    push_file_at(git_server, monkeypatch, "foo", 1500002000, "second foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    capfd.readouterr()
+
+    tsrc_cli.run("log", "--from", "v0.1", "--merged", "--format=json", "-j", "3")
+
+    out, _ = capfd.readouterr()
+    commits = [json.loads(line) for line in out.splitlines()]
+    assert [(x["src"], x["subject"]) for x in commits] == [
+        ("foo", "second foo"), ("spam", "spam"), ("foo", "first foo"),
+    ]
+
+    tsrc_cli.run("log", "--from", "v0.1", "--merged")
+
+    out, _ = capfd.readouterr()
+    lines = [line for line in out.splitlines() if "foo" in line or "spam" in line]
+    assert len(lines) == 3
+    assert "second foo <" in lines[0]
+    assert lines[1].split()[2] == "spam"
+
+
+def test_merged_error(tsrc_cli: CLI, git_server: GitServer, capfd: Any) -> None:
+    git_server.add_repos(["foo", "spam"])
+    git_server.tag("foo", "v0.1")
+    git_server.push_file("foo", "foo.txt", message="new foo!")
+    tsrc_cli.run("init", git_server.manifest_url)
+    capfd.readouterr()
+
+    tsrc_cli.run("log", "--from", "v0.1", "--merged", expect_fail=True)
+
+    out, err = capfd.readouterr()
+    assert "new foo!" in out
+    assert "spam" in err
+
+
+def test_json_ignores_git_warnings(tsrc_cli: CLI, git_server: GitServer, capfd: Any) -> None:
+    git_server.add_repo("foo")
+    git_server.tag("foo", "v1")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "foo.txt", message="new foo!")
+    tsrc_cli.run("sync")
+    # A branch with the same name as the tag: git log warns that
+    # the refname is ambiguous, but succeeds
+    tsrc.git.run_git(tsrc_cli.workspace_path.joinpath("foo"), "branch", "v1", "v1")
+    capfd.readouterr()
+
+    tsrc_cli.run("log", "--from", "v1", "--format=json")
+
+    out, _ = capfd.readouterr()
+    (foo,) = [json.loads(line) for line in out.splitlines()]
+    assert foo["rc"] == 0
+    assert [x["subject"] for x in foo["commits"]] == ["new foo!"]
+
+
+def test_json_error(tsrc_cli: CLI, git_server: GitServer, capfd: Any) -> None:
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    capfd.readouterr()
+
+    tsrc_cli.run("log", "--from", "v0.1", "--format=json", expect_fail=True)
+
+    out, _ = capfd.readouterr()
+    (foo,) = [json.loads(line) for line in out.splitlines()]
+    assert foo["rc"] != 0
+    assert foo["commits"] == []
+    assert "v0.1" in foo["error"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="uses a POSIX shell")
+def test_merged_with_pager(tsrc_cli: CLI, git_server: GitServer, tmp_path: Path,
+                           monkeypatch: Any) -> None:
+    git_server.add_repo("foo")
+    git_server.tag("foo", "v0.1")
+    git_server.push_file("foo", "foo.txt", message="new foo ☺")
+    tsrc_cli.run("init", git_server.manifest_url)
+    paged_path = tmp_path.joinpath("paged.txt")
+    monkeypatch.setenv("TSRC_PAGER", "sh -c 'cat > %s'" % paged_path)
+    monkeypatch.setattr(sys.stdout, "isatty", lambda: True)
+
+    tsrc_cli.run("--color=never", "log", "--from", "v0.1", "--merged")
+
+    assert "new foo ☺" in paged_path.text(encoding="utf-8")
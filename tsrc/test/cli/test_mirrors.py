@@ -0,0 +1,128 @@
+import threading
+from typing import List  # noqa
+
+from path import Path
+import pytest
+
+import tsrc.config
+import tsrc.git
+import tsrc.mirror
+
+from ui.tests.conftest import message_recorder
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+@pytest.fixture
+def mirrors_path(tmp_path: Path, tsrc_config_path: Path) -> Path:
+    mirrors_path = tmp_path.joinpath("mirrors")
+    tsrc_config_path.write_text("mirrors:\n  path: %s\n" % mirrors_path)
+    return mirrors_path
+
+
+def get_alternates(repo_path: Path) -> str:
+    alternates_path = repo_path.joinpath(".git", "objects", "info", "alternates")
+    if not alternates_path.exists():
+        return ""
+    return alternates_path.text()
+
+
+def test_init_uses_mirrors(tsrc_cli: CLI, git_server: GitServer,
+                           workspace_path: Path, mirrors_path: Path) -> None:
+    foo_url = git_server.add_repo("foo")
+    mirror_cache = tsrc.mirror.MirrorCache(mirrors_path)
+    foo_mirror = mirror_cache.get_path(foo_url)
+
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    assert foo_mirror.exists()
+    assert foo_mirror in get_alternates(workspace_path.joinpath("foo"))
+
+
+def test_mirrors_are_never_pruned(tsrc_cli: CLI, git_server: GitServer,
+                                  mirrors_path: Path) -> None:
+    foo_url = git_server.add_repo("foo")
+
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    foo_mirror = tsrc.mirror.MirrorCache(mirrors_path).get_path(foo_url)
+    _, prune_expire = tsrc.git.run_git_captured(foo_mirror, "config", "gc.pruneExpire")
+    assert prune_expire == "never"
+    _, gc_auto = tsrc.git.run_git_captured(foo_mirror, "config", "gc.auto")
+    assert gc_auto == "0"
+
+
+def test_sync_refreshes_mirrors(tsrc_cli: CLI, git_server: GitServer,
+                                mirrors_path: Path) -> None:
+    foo_url = git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "new.txt")
+
+    tsrc_cli.run("sync")
+
+    foo_mirror = tsrc.mirror.MirrorCache(mirrors_path).get_path(foo_url)
+    _, mirror_sha1 = tsrc.git.run_git_captured(foo_mirror, "rev-parse", "master")
+    assert mirror_sha1 == git_server.get_sha1("foo")
+
+
+def test_dissociate(tsrc_cli: CLI, git_server: GitServer, tmp_path: Path,
+                    workspace_path: Path, mirrors_path: Path) -> None:
+    tsrc_yml_path = tsrc.config.get_tsrc_config_path()
+    tsrc_yml_path.write_text(tsrc_yml_path.text() + "  dissociate: true\n")
+    git_server.add_repo("foo")
+
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    assert not get_alternates(workspace_path.joinpath("foo"))
+
+
+def test_mirror_names() -> None:
+    mirror_cache = tsrc.mirror.MirrorCache(Path("/cache"))
+    one = mirror_cache.get_path("git@example.com:one/foo.git")
+    two = mirror_cache.get_path("git@example.com:two/foo.git")
+    assert one.name.startswith("foo-")
+    assert one != two
+
+
+def test_other_sections_are_not_validated(tsrc_cli: CLI, git_server: GitServer,
+                                          workspace_path: Path, mirrors_path: Path) -> None:
+    tsrc_yml_path = tsrc.config.get_tsrc_config_path()
+    tsrc_yml_path.write_text(tsrc_yml_path.text() + "auth:\n  gitlab: 42\n")
+    git_server.add_repo("foo")
+
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    foo_mirror = tsrc.mirror.MirrorCache(mirrors_path).get_path(git_server.get_url("foo"))
+    assert foo_mirror in get_alternates(workspace_path.joinpath("foo"))
+
+
+def test_invalid_mirrors_config(tsrc_cli: CLI, git_server: GitServer,
+                                workspace_path: Path, mirrors_path: Path,
+                                message_recorder: message_recorder) -> None:
+    tsrc.config.get_tsrc_config_path().write_text("mirrors:\n  dissociate: true\n")
+    git_server.add_repo("foo")
+
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("sync")
+
+    assert message_recorder.find("not using mirrors")
+    assert not get_alternates(workspace_path.joinpath("foo"))
+
+
+def test_parallel_clones_wait_for_the_mirror(git_server: GitServer, tmp_path: Path) -> None:
+    git_server.add_repo("foo")
+    url = git_server.get_url("foo")
+    mirror_cache = tsrc.mirror.MirrorCache(tmp_path.joinpath("mirrors"))
+    mirror_found = list()  # type: List[bool]
+
+    def get_clone_args() -> None:
+        mirror_cache.get_clone_args(url)
+        mirror_found.append(mirror_cache.get_path(url).exists())
+
+    threads = [threading.Thread(target=get_clone_args) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert mirror_found == [True] * 4
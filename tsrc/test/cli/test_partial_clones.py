@@ -0,0 +1,59 @@
+from path import Path
+
+import tsrc.git
+
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+def allow_filters(git_server: GitServer, name: str) -> None:
+    bare_path = git_server.bare_path.joinpath(name)
+    tsrc.git.run_git(bare_path, "config", "uploadpack.allowFilter", "true")
+
+
+def get_clone_filter(workspace_path: Path, repo: str) -> str:
+    repo_path = workspace_path.joinpath(repo)
+    _, out = tsrc.git.run_git_captured(
+        repo_path, "config", "remote.origin.partialclonefilter", check=False
+    )
+    return out
+
+
+def test_partial_clones(tsrc_cli: CLI, git_server: GitServer, workspace_path: Path) -> None:
+    git_server.add_repo("foo")
+    allow_filters(git_server, "foo")
+
+    tsrc_cli.run("init", "--filter", "blob:none", git_server.manifest_url)
+    assert get_clone_filter(workspace_path, "foo") == "blob:none"
+
+    git_server.add_repo("bar")
+    allow_filters(git_server, "bar")
+    tsrc_cli.run("sync")
+    assert get_clone_filter(workspace_path, "bar") == "blob:none"
+
+
+def test_partial_clone_per_repo(tsrc_cli: CLI, git_server: GitServer,
+                                workspace_path: Path) -> None:
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    allow_filters(git_server, "foo")
+    git_server.manifest.configure_repo("foo", "clone_filter", "tree:0")
+
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    assert get_clone_filter(workspace_path, "foo") == "tree:0"
+    assert get_clone_filter(workspace_path, "bar") == ""
+
+
+def test_partial_clone_with_fixed_sha1(tsrc_cli: CLI, git_server: GitServer,
+                                       workspace_path: Path) -> None:
+    git_server.add_repo("foo")
+    allow_filters(git_server, "foo")
+    initial_sha1 = git_server.get_sha1("foo")
+    git_server.push_file("foo", "one.c")
+    git_server.manifest.set_repo_sha1("foo", initial_sha1)
+
+    tsrc_cli.run("init", "--filter", "blob:none", git_server.manifest_url)
+
+    foo_path = workspace_path.joinpath("foo")
+    assert tsrc.git.get_sha1(foo_path) == initial_sha1
@@ -0,0 +1,66 @@
+from path import Path
+
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+def setup_sparse_repo(git_server: GitServer) -> None:
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "top.txt")
+    git_server.push_file("foo", "docs/index.md")
+    git_server.push_file("foo", "src/lib/one.c")
+    git_server.push_file("foo", "tests/test_one.c")
+    git_server.manifest.configure_repo("foo", "sparse", ["src"])
+
+
+def test_sparse_clone(tsrc_cli: CLI, git_server: GitServer, workspace_path: Path) -> None:
+    setup_sparse_repo(git_server)
+
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    foo_path = workspace_path.joinpath("foo")
+    assert foo_path.joinpath("top.txt").exists()
+    assert foo_path.joinpath("src/lib/one.c").exists()
+    assert not foo_path.joinpath("docs").exists()
+    assert not foo_path.joinpath("tests").exists()
+
+
+def test_sync_updates_sparse_paths(tsrc_cli: CLI, git_server: GitServer,
+                                   workspace_path: Path) -> None:
+    setup_sparse_repo(git_server)
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    git_server.manifest.configure_repo("foo", "sparse", ["src", "tests"])
+    tsrc_cli.run("sync")
+
+    foo_path = workspace_path.joinpath("foo")
+    assert foo_path.joinpath("tests/test_one.c").exists()
+    assert not foo_path.joinpath("docs").exists()
+
+
+def test_sync_new_files_in_sparse_repo(tsrc_cli: CLI, git_server: GitServer,
+                                       workspace_path: Path) -> None:
+    setup_sparse_repo(git_server)
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    git_server.push_file("foo", "src/two.c")
+    git_server.push_file("foo", "docs/two.md")
+    tsrc_cli.run("sync")
+
+    foo_path = workspace_path.joinpath("foo")
+    assert foo_path.joinpath("src/two.c").exists()
+    assert not foo_path.joinpath("docs").exists()
+
+
+def test_sync_when_sparse_is_removed(tsrc_cli: CLI, git_server: GitServer,
+                                     workspace_path: Path) -> None:
+    setup_sparse_repo(git_server)
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    del git_server.manifest.get_repo("foo")["sparse"]
+    git_server.manifest.push("Remove foo sparse")
+    tsrc_cli.run("sync")
+
+    foo_path = workspace_path.joinpath("foo")
+    assert foo_path.joinpath("docs/index.md").exists()
+    assert foo_path.joinpath("tests/test_one.c").exists()
@@ -1,6 +1,10 @@
+import json
+from typing import Any
+
 from path import Path
 
 import tsrc.cli
+import tsrc.status_cache
 
 from ui.tests.conftest import message_recorder
 from tsrc.test.helpers.cli import CLI
@@ -73,3 +77,64 @@ def test_status_on_tag(tsrc_cli: CLI, git_server: GitServer,
 
     assert message_recorder.find(r"\* foo/bar   master")
     assert message_recorder.find(r"\* spam/eggs v1.0")
+
+
+def test_status_in_manifest_order(tsrc_cli: CLI, git_server: GitServer,
+                                  workspace_path: Path, capfd: Any) -> None:
+    names = ["repo-%d" % i for i in range(8)]
+    git_server.add_repos(names)
+    tsrc_cli.run("init", git_server.manifest_url)
+    workspace_path.joinpath("repo-3", "README").write_text("DIRTY FILE")
+    capfd.readouterr()
+
+    tsrc_cli.run("status", "-j", "4")
+
+    out, _ = capfd.readouterr()
+    status_lines = [line for line in out.splitlines() if line.startswith("* repo-")]
+    assert [line.split()[1] for line in status_lines] == names
+    assert "* repo-3 master (dirty)" in status_lines
+
+
+def test_status_cache(tsrc_cli: CLI, git_server: GitServer, workspace_path: Path,
+                      message_recorder: message_recorder, monkeypatch: Any) -> None:
+    monkeypatch.setattr(tsrc.status_cache, "RACY_DELAY_NS", 0)
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    foo_path = workspace_path.joinpath("foo")
+    tsrc.git.run_git(foo_path, "tag", "v1.0")
+    cache_path = workspace_path.joinpath(".tsrc", "status-cache")
+
+    tsrc_cli.run("status", "--no-cache")
+    assert not cache_path.exists()
+
+    tsrc_cli.run("status")
+    assert cache_path.exists()
+
+    tsrc.git.run_git(foo_path, "tag", "--delete", "v1.0")
+    message_recorder.reset()
+    tsrc_cli.run("status")
+    assert message_recorder.find(r"\* foo master")
+
+
+def test_status_json(tsrc_cli: CLI, git_server: GitServer,
+                     workspace_path: Path, capfd: Any) -> None:
+    git_server.add_repos(["foo", "bar"])
+    tsrc_cli.run("init", git_server.manifest_url)
+    workspace_path.joinpath("bar", "README").write_text("DIRTY FILE")
+    capfd.readouterr()
+
+    tsrc_cli.run("status", "--format=json")
+
+    out, _ = capfd.readouterr()
+    objects = [json.loads(line) for line in out.splitlines()]
+    assert [x["src"] for x in objects] == ["foo", "bar"]
+    assert objects[0]["branch"] == "master"
+    assert not objects[0]["dirty"]
+    assert objects[1]["dirty"]
+
+
+def test_status_needs_at_least_one_job(tsrc_cli: CLI, git_server: GitServer) -> None:
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    tsrc_cli.run("status", "-j", "0", expect_fail=True)
@@ -1,4 +1,5 @@
 from typing import Any
+import json
 import os
 
 from path import Path
@@ -39,6 +40,59 @@ def test_sync_with_errors(tsrc_cli: CLI, git_server: GitServer, workspace_path:
     assert message_recorder.find(r"\* foo/bar")
 
 
+def test_sync_retry_failed(tsrc_cli: CLI, git_server: GitServer, workspace_path:
+                           Path, message_recorder: message_recorder) -> None:
+    git_server.add_repo("foo/bar")
+    git_server.add_repo("spam/eggs")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo/bar", "bar.txt", contents="Bar is true")
+    git_server.push_file("spam/eggs", "eggs.txt", contents="Eggs are true")
+    bar_src = workspace_path.joinpath("foo/bar")
+    bar_src.joinpath("bar.txt").write_text("Bar is false")
+    tsrc_cli.run("sync", expect_fail=True)
+    assert workspace_path.joinpath(".tsrc/sync-journal").exists()
+
+    bar_src.joinpath("bar.txt").remove()
+    git_server.push_file("spam/eggs", "eggs.txt", contents="Eggs are still true")
+    message_recorder.reset()
+    tsrc_cli.run("sync", "--retry-failed")
+
+    assert bar_src.joinpath("bar.txt").text() == "Bar is true"
+    # spam/eggs was synced during the first run, so it is skipped
+    eggs_txt = workspace_path.joinpath("spam/eggs/eggs.txt")
+    assert eggs_txt.text() == "Eggs are true"
+    assert not workspace_path.joinpath(".tsrc/sync-journal").exists()
+
+
+def test_sync_with_timings(tsrc_cli: CLI, git_server: GitServer,
+                           message_recorder: message_recorder) -> None:
+    git_server.add_repo("foo/bar")
+    git_server.add_repo("spam/eggs")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo/bar", "bar.txt")
+
+    tsrc_cli.run("--timings", "sync")
+
+    assert message_recorder.find("Slowest items")
+    assert message_recorder.find("Synchronize workspace")
+
+
+def test_sync_with_trace(tsrc_cli: CLI, git_server: GitServer, tmp_path: Path) -> None:
+    git_server.add_repo("foo/bar")
+    git_server.add_repo("spam/eggs")
+    tsrc_cli.run("init", git_server.manifest_url)
+    trace_path = tmp_path.joinpath("trace.json")
+
+    tsrc_cli.run("--trace", str(trace_path), "sync")
+
+    events = json.loads(trace_path.text())["traceEvents"]
+    names = {(e.get("cat"), e["name"]) for e in events}
+    assert ("command", "tsrc sync") in names
+    assert ("phase", "Synchronize workspace") in names
+    assert ("item", "spam/eggs") in names
+    assert ("git", "git ls-remote") in names
+
+
 def test_sync_finds_root(tsrc_cli: CLI, git_server: GitServer, workspace_path:
                          Path, monkeypatch: Any) -> None:
     git_server.add_repo("foo/bar")
@@ -255,3 +309,21 @@ def test_custom_group(tsrc_cli: CLI, git_server: GitServer, message_recorder:
     tsrc_cli.run("sync")
     assert message_recorder.find("bar")
     assert not message_recorder.find("other")
+
+
+def test_bad_branches_in_manifest_order(tsrc_cli: CLI, git_server: GitServer,
+                                        workspace_path: Path, capfd: Any) -> None:
+    names = ["repo-%d" % i for i in range(6)]
+    git_server.add_repos(names)
+    tsrc_cli.run("init", git_server.manifest_url)
+    for name in names:
+        repo_path = workspace_path.joinpath(name)
+        tsrc.git.run_git(repo_path, "checkout", "-B", "devel")
+        tsrc.git.run_git(repo_path, "push", "-u", "origin", "devel", "--no-verify")
+    capfd.readouterr()
+
+    tsrc_cli.run("sync", "-j", "6", expect_fail=True)
+
+    out, _ = capfd.readouterr()
+    table_lines = [line for line in out.splitlines() if "devel" in line]
+    assert [line.split()[0] for line in table_lines] == names
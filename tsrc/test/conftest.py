@@ -5,6 +5,7 @@ from path import Path
 import pytest
 
 import tsrc.cli.main
+import tsrc.config
 import tsrc.git
 from tsrc.workspace import Workspace
 import tsrc.workspace
@@ -21,6 +22,14 @@ def tmp_path(tmpdir: Any) -> Path:
     return Path(tmpdir.strpath)
 
 
+@pytest.fixture(autouse=True)
+def tsrc_config_path(tmp_path: Path, monkeypatch: Any) -> Path:
+    """ Make sure the tests never read the tsrc.yml of the user """
+    res = tmp_path.joinpath("tsrc.yml")
+    monkeypatch.setattr(tsrc.config, "get_tsrc_config_path", lambda: res)
+    return res
+
+
 @pytest.fixture
 def workspace_path(tmp_path: Path) -> Path:
     return tmp_path.joinpath("work").mkdir()
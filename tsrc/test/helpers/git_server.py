@@ -1,4 +1,8 @@
-from typing import cast, Any, Dict, List, Tuple
+from typing import cast, Any, Dict, List, Optional, Tuple  # noqa
+import atexit
+import shutil
+import tempfile
+
 import ruamel.yaml
 import pytest
 
@@ -9,6 +13,10 @@ from path import Path
 RepoConfig = Dict[str, Any]
 CopyConfig = Tuple[str, str]
 
+# Created on first use, and shared by all the GitServer instances
+# of the process, see get_template_path()
+_TEMPLATE_PATH = None  # type: Optional[Path]
+
 
 class ManifestHandler():
     def __init__(self, path: Path) -> None:
@@ -33,6 +41,12 @@ class ManifestHandler():
         self.data["repos"].append(repo_config)
         self.push(message="add %s" % src)
 
+    def add_repos(self, repos: List[Tuple[str, str]]) -> None:
+        """ Add several (src, url) pairs with a single push """
+        for src, url in repos:
+            self.data["repos"].append({"url": str(url), "src": src})
+        self.push(message="add %d repos" % len(repos))
+
     def configure_group(self, name: str, repos: List[str]) -> None:
         groups = self.data.get("groups")
         if not groups:
@@ -112,6 +126,9 @@ class GitServer():
 
     def _create_repo(self, name: str, empty: bool = False, branch: str = "master") -> str:
         bare_path = self.bare_path.joinpath(name)
+        if branch == "master" and not empty:
+            copy_template(bare_path, self.get_path(name))
+            return str(bare_path)
         bare_path.makedirs_p()
         tsrc.git.run_git(bare_path, "init", "--bare")
         src_path = self.get_path(name)
@@ -137,6 +154,18 @@ class GitServer():
             self.manifest.add_repo(name, url, branch=default_branch)
         return url
 
+    def add_repos(self, names: List[str]) -> List[str]:
+        """ Same as calling add_repo() for each name, but faster,
+        because the manifest is only pushed once
+
+        """
+        urls = list()
+        for name in names:
+            self._create_repo(name)
+            urls.append(self.get_url(name))
+        self.manifest.add_repos(list(zip(names, urls)))
+        return urls
+
     def add_group(self, group_name: str, repos: List[str]) -> None:
         for repo in repos:
             self.add_repo(repo)
@@ -195,6 +224,46 @@ class GitServer():
         tsrc.git.run_git(src_path, "push", "origin", "--delete", branch)
 
 
+def get_template_path() -> Path:
+    """ Return the path of a bare repo with an initial commit on master
+    (in <template>/srv), and of a clone of it (in <template>/src)
+
+    New repos are created by copying the template, which is much
+    faster than running the git commands again.
+    """
+    global _TEMPLATE_PATH
+    if _TEMPLATE_PATH:
+        return _TEMPLATE_PATH
+    template_path = Path(tempfile.mkdtemp(prefix="tsrc-git-template-"))
+    atexit.register(template_path.rmtree_p)
+    bare_path = template_path.joinpath("srv")
+    src_path = template_path.joinpath("src")
+    bare_path.makedirs_p()
+    src_path.makedirs_p()
+    # Empty templates, so that no hook samples have to be copied
+    tsrc.git.run_git(bare_path, "init", "--bare", "--template=")
+    tsrc.git.run_git(src_path, "init", "--template=")
+    tsrc.git.run_git(src_path, "remote", "add", "origin", bare_path)
+    tsrc.git.run_git(bare_path, "symbolic-ref", "HEAD", "refs/heads/master")
+    src_path.joinpath("README").touch()
+    tsrc.git.run_git(src_path, "add", "README")
+    tsrc.git.run_git(src_path, "commit", "--message", "Initial commit")
+    tsrc.git.run_git(src_path, "push", "origin", "master:master")
+    _TEMPLATE_PATH = template_path
+    return template_path
+
+
+def copy_template(bare_path: Path, src_path: Path) -> None:
+    template_path = get_template_path()
+    template_bare_path = template_path.joinpath("srv")
+    shutil.copytree(template_bare_path, bare_path)
+    shutil.copytree(template_path.joinpath("src"), src_path)
+    # The only path stored in the template is the URL of the remote
+    config_path = src_path.joinpath(".git", "config")
+    config = config_path.text()
+    config_path.write_text(config.replace(template_bare_path, bare_path))
+
+
 @pytest.fixture
 def git_server(tmp_path: Path) -> GitServer:
     return GitServer(tmp_path)
@@ -0,0 +1,134 @@
+import socket
+import sys
+import threading
+import time
+from typing import Any, Iterator
+
+from path import Path
+import pytest
+
+import tsrc.daemon
+import tsrc.git
+from tsrc.daemon import StatusDaemon
+from tsrc.workspace import Workspace
+
+from ui.tests.conftest import message_recorder
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"),
+                                reason="the daemon uses inotify")
+
+
+@pytest.fixture
+def daemon(tsrc_cli: CLI, git_server: GitServer, workspace_path: Path,
+           monkeypatch: Any) -> Iterator[StatusDaemon]:
+    # Set by the daemon: make sure it is restored after the test
+    monkeypatch.setenv("GIT_OPTIONAL_LOCKS", "0")
+    git_server.add_repos(["foo", "bar"])
+    tsrc_cli.run("init", git_server.manifest_url)
+    res = StatusDaemon(Workspace(workspace_path, num_jobs=2))
+    thread = threading.Thread(target=res.serve_forever)
+    thread.start()
+    workspace = Workspace(workspace_path)
+    workspace.load_manifest()
+    for _ in range(100):
+        if tsrc.daemon.get_statuses(workspace) is not None:
+            break
+        time.sleep(0.05)
+    yield res
+    res.stop_requested = True
+    thread.join()
+
+
+def get_statuses(workspace_path: Path) -> Any:
+    workspace = Workspace(workspace_path)
+    workspace.load_manifest()
+    statuses = tsrc.daemon.get_statuses(workspace)
+    assert statuses is not None
+    return dict(statuses)
+
+
+def test_daemon_tracks_changes(daemon: StatusDaemon, workspace_path: Path) -> None:
+    statuses = get_statuses(workspace_path)
+    assert not statuses["foo"].dirty
+    assert statuses["bar"].branch == "master"
+
+    workspace_path.joinpath("foo", "README").write_text("changed\n")
+    tsrc.git.run_git(workspace_path.joinpath("bar"), "checkout", "-b", "fish")
+    statuses = get_statuses(workspace_path)
+    assert statuses["foo"].dirty
+    assert statuses["bar"].branch == "fish"
+
+    workspace_path.joinpath("foo", "new_dir").mkdir()
+    workspace_path.joinpath("foo", "README").write_text("")
+    statuses = get_statuses(workspace_path)
+    assert not statuses["foo"].dirty
+    workspace_path.joinpath("foo", "new_dir", "new.txt").write_text("new\n")
+    statuses = get_statuses(workspace_path)
+    assert statuses["foo"].untracked == 1
+
+
+def test_status_uses_daemon(daemon: StatusDaemon, tsrc_cli: CLI,
+                            message_recorder: message_recorder, monkeypatch: Any) -> None:
+    def fail(*args: Any, **kwargs: Any) -> None:
+        assert False, "should not run git status"
+
+    monkeypatch.setattr(tsrc.git, "get_status", fail)
+    tsrc_cli.run("status")
+    assert message_recorder.find(r"\* foo master")
+
+
+def test_only_one_daemon(daemon: StatusDaemon, workspace_path: Path) -> None:
+    other_daemon = StatusDaemon(Workspace(workspace_path))
+    with pytest.raises(tsrc.daemon.DaemonError):
+        other_daemon.serve_forever()
+
+
+def test_no_daemon(tsrc_cli: CLI, git_server: GitServer, workspace_path: Path) -> None:
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    workspace = Workspace(workspace_path)
+    workspace.load_manifest()
+    assert tsrc.daemon.get_statuses(workspace) is None
+
+
+def send_raw(workspace_path: Path, data: bytes) -> bytes:
+    socket_path = tsrc.daemon.get_socket_path(Workspace(workspace_path))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(5)
+        conn.connect(socket_path)
+        conn.sendall(data)
+        return tsrc.daemon.read_line(conn)
+
+
+def test_bad_requests(daemon: StatusDaemon, workspace_path: Path) -> None:
+    assert b"unknown command" in send_raw(workspace_path, b"[1]\n")
+    send_raw(workspace_path, b"\xff\n")
+    assert get_statuses(workspace_path)["foo"].branch == "master"
+
+
+def test_unexpected_error_in_one_repo(daemon: StatusDaemon, workspace_path: Path,
+                                      monkeypatch: Any) -> None:
+    get_status = tsrc.git.get_status
+
+    def fail_on_foo(working_path: Path) -> tsrc.git.GitStatus:
+        if working_path.name == "foo":
+            raise RuntimeError("Kaboom")
+        return get_status(working_path)
+
+    monkeypatch.setattr(tsrc.git, "get_status", fail_on_foo)
+    workspace_path.joinpath("foo", "README").write_text("changed\n")
+    workspace_path.joinpath("bar", "README").write_text("changed\n")
+    workspace = Workspace(workspace_path)
+    workspace.load_manifest()
+    response = tsrc.daemon.query(workspace, {"command": "status"})
+    assert response
+    foo, bar = response["repos"]
+    assert "Kaboom" in foo["error"]
+    assert bar["status"]["dirty"]
+    # The client computes the statuses itself
+    assert tsrc.daemon.get_statuses(workspace) is None
+
+    monkeypatch.setattr(tsrc.git, "get_status", get_status)
+    assert get_statuses(workspace_path)["foo"].dirty
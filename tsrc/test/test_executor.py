@@ -1,8 +1,14 @@
+import time
+from typing import Any, List  # noqa
+
+from path import Path
 import pytest
 import ui
 
 import tsrc
 import tsrc.executor
+import tsrc.git
+import tsrc.journal
 
 
 class Kaboom(tsrc.Error):
@@ -12,7 +18,7 @@ class Kaboom(tsrc.Error):
 
 class FakeTask(tsrc.executor.Task[str]):
     def __init__(self) -> None:
-        pass
+        self.processed = list()  # type: List[str]
 
     def description(self) -> str:
         return "Frobnicating all items"
@@ -21,6 +27,7 @@ class FakeTask(tsrc.executor.Task[str]):
         return item
 
     def process(self, item: str) -> None:
+        self.processed.append(item)
         ui.info("frobnicate", item)
         if item == "bar":
             print("ko :/")
@@ -42,3 +49,82 @@ def test_collect_errors() -> None:
     task = FakeTask()
     with pytest.raises(tsrc.executor.ExecutorFailed):
         tsrc.executor.run_sequence(["foo", "bar"], task)
+
+
+def test_parallel_happy() -> None:
+    task = FakeTask()
+    tsrc.executor.run_sequence(["foo", "spam", "eggs"], task, num_jobs=2)
+
+
+def test_parallel_collect_errors_in_order() -> None:
+    task = FakeTask()
+    executor = tsrc.executor.ParallelExecutor(task, num_jobs=4)
+    with pytest.raises(tsrc.executor.ExecutorFailed):
+        executor.process(["foo", "bar", "spam", "bar"])
+    assert [item for (item, error) in executor.errors] == ["bar", "bar"]
+
+
+class SlowTask(FakeTask):
+    def process(self, item: str) -> None:
+        ui.info("start", item)
+        time.sleep(0.05)
+        tsrc.git.run_git(Path.getcwd(), "version")
+        ui.info("end", item)
+
+
+def test_parallel_output_is_not_interleaved(capfd: Any) -> None:
+    items = ["foo", "spam", "eggs"]
+    tsrc.executor.run_sequence(items, SlowTask(), num_jobs=3)
+
+    lines = capfd.readouterr().out.splitlines()
+    for item in items:
+        (index,) = [i for i, line in enumerate(lines) if line.endswith("start " + item)]
+        # After the counter, like with SequentialExecutor
+        assert "/3)" in lines[index]
+        assert lines[index + 1].startswith("git version")
+        assert lines[index + 2] == "end " + item
+
+
+def test_resume_skips_items_done(tmp_path: Path) -> None:
+    journal_path = tmp_path.joinpath("journal")
+    journal = tsrc.journal.Journal(journal_path)
+    journal.start()
+    with pytest.raises(tsrc.executor.ExecutorFailed):
+        tsrc.executor.run_sequence(["foo", "bar", "spam"], FakeTask(), journal=journal)
+
+    journal = tsrc.journal.Journal(journal_path, mode=tsrc.journal.RESUME)
+    journal.start()
+    task = FakeTask()
+    with pytest.raises(tsrc.executor.ExecutorFailed):
+        tsrc.executor.run_sequence(["foo", "bar", "spam", "eggs"], task, journal=journal)
+    assert task.processed == ["bar", "eggs"]
+
+
+def test_retry_failed_items(tmp_path: Path) -> None:
+    journal_path = tmp_path.joinpath("journal")
+    journal = tsrc.journal.Journal(journal_path)
+    journal.start()
+    with pytest.raises(tsrc.executor.ExecutorFailed):
+        tsrc.executor.run_sequence(["foo", "bar", "spam"], FakeTask(),
+                                   num_jobs=2, journal=journal)
+
+    journal = tsrc.journal.Journal(journal_path, mode=tsrc.journal.RETRY_FAILED)
+    journal.start()
+    task = FakeTask()
+    with pytest.raises(tsrc.executor.ExecutorFailed):
+        tsrc.executor.run_sequence(["foo", "bar", "spam", "eggs"], task, journal=journal)
+    assert task.processed == ["bar"]
+
+
+def test_journal_ignores_truncated_entries(tmp_path: Path) -> None:
+    journal_path = tmp_path.joinpath("journal")
+    journal = tsrc.journal.Journal(journal_path)
+    journal.start()
+    journal.record("FakeTask", "foo", ok=True)
+    with open(journal_path, "a") as fp:
+        fp.write('{"task": "FakeTask", "ite')
+
+    journal = tsrc.journal.Journal(journal_path, mode=tsrc.journal.RESUME)
+    journal.start()
+    assert journal.should_skip("FakeTask", "foo")
+    assert not journal.should_skip("FakeTask", "bar")
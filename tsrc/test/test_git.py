@@ -0,0 +1,112 @@
+from path import Path
+
+import tsrc.git
+from tsrc.test.helpers.git_server import GitServer
+
+
+def test_parse_porcelain_v2_records(tmp_path: Path) -> None:
+    status = tsrc.git.GitStatus(tmp_path)
+    records = [
+        "# branch.oid 7ab2f5d4a3c8e6f2d0e39b1e1a3c6e1d0f9e8a7b",
+        "# branch.head master",
+        "# branch.upstream origin/master",
+        "# branch.ab +2 -3",
+        "1 .M N... 100644 100644 100644 aaaa bbbb CMakeLists.txt",
+        "1 A. N... 000000 100644 100644 0000 cccc new.txt",
+        "1 M. N... 100644 100644 100644 dddd eeee staged.txt",
+        "? untracked.txt",
+    ]
+    for record in records:
+        status.parse_record(record)
+    assert status.sha1 == "7ab2f5d"
+    assert status.branch == "master"
+    assert status.ahead == 2
+    assert status.behind == 3
+    assert status.untracked == 1
+    assert status.added == 1
+    assert status.staged == 1
+    assert status.not_staged == 1
+    assert status.dirty
+
+
+def test_parse_porcelain_v2_detached(tmp_path: Path) -> None:
+    status = tsrc.git.GitStatus(tmp_path)
+    status.parse_record("# branch.oid (initial)")
+    status.parse_record("# branch.head (detached)")
+    assert status.sha1 is None
+    assert status.branch is None
+    assert not status.dirty
+
+
+def test_get_status(git_server: GitServer) -> None:
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "foo.txt")
+    foo_path = git_server.get_path("foo")
+    foo_path.joinpath("foo.txt").write_text("changed")
+    foo_path.joinpath("bar.txt").write_text("new")
+    tsrc.git.run_git(foo_path, "mv", "foo.txt", "renamed.txt")
+
+    status = tsrc.git.get_status(foo_path)
+
+    assert status.sha1 == git_server.get_sha1("foo")[:7]
+    assert status.branch == "master"
+    assert status.ahead == 0
+    assert status.behind == 0
+    assert status.staged == 1
+    assert status.not_staged == 1
+    assert status.untracked == 1
+    assert status.dirty
+
+
+def test_needs_fetch(git_server: GitServer, tmp_path: Path) -> None:
+    git_server.add_repo("foo")
+    foo_path = tmp_path.joinpath("foo")
+    tsrc.git.run_git(tmp_path, "clone", git_server.get_url("foo"), foo_path)
+    assert not tsrc.git.needs_fetch(foo_path)
+    assert tsrc.git.head_is_upstream(foo_path)
+
+    git_server.push_file("foo", "new.txt")
+    assert tsrc.git.needs_fetch(foo_path)
+    tsrc.git.run_git(foo_path, "fetch", "--tags", "--prune", "origin")
+    assert not tsrc.git.needs_fetch(foo_path)
+    assert not tsrc.git.head_is_upstream(foo_path)
+
+    git_server.tag("foo", "v0.1")
+    assert tsrc.git.needs_fetch(foo_path)
+    tsrc.git.run_git(foo_path, "fetch", "--tags", "--prune", "origin")
+    assert not tsrc.git.needs_fetch(foo_path)
+
+    git_server.change_repo_branch("foo", "devel")
+    tsrc.git.run_git(foo_path, "fetch", "--tags", "--prune", "origin")
+    git_server.delete_branch("foo", "devel")
+    assert tsrc.git.needs_fetch(foo_path)
+
+
+def test_needs_fetch_when_tags_were_deleted(git_server: GitServer, tmp_path: Path) -> None:
+    git_server.add_repo("foo")
+    git_server.tag("foo", "v0.1")
+    foo_path = tmp_path.joinpath("foo")
+    tsrc.git.run_git(tmp_path, "clone", git_server.get_url("foo"), foo_path)
+    assert not tsrc.git.needs_fetch(foo_path)
+
+    tsrc.git.run_git(git_server.bare_path.joinpath("foo"), "tag", "--delete", "v0.1")
+    # Without pruneTags, the fetch would keep the tag
+    assert not tsrc.git.needs_fetch(foo_path)
+    tsrc.git.run_git(foo_path, "fetch", "--tags", "--prune", "origin")
+    assert tsrc.git.get_current_tag(foo_path) == "v0.1"
+
+    tsrc.git.run_git(foo_path, "config", "remote.origin.pruneTags", "true")
+    assert tsrc.git.needs_fetch(foo_path)
+    tsrc.git.run_git(foo_path, "fetch", "--tags", "--prune", "origin")
+    assert not tsrc.git.needs_fetch(foo_path)
+
+
+def test_iter_git_records_kills_git_when_closed(git_server: GitServer) -> None:
+    git_server.add_repo("foo")
+    for i in range(3):
+        git_server.push_file("foo", "file-%d.txt" % i)
+    foo_path = git_server.get_path("foo")
+    records = tsrc.git.iter_git_records(foo_path, "log", "-z", "--pretty=format:%H")
+    assert next(records) == tsrc.git.get_sha1(foo_path)
+    # Should not wait for git to finish, nor raise
+    records.close()
@@ -0,0 +1,113 @@
+import textwrap
+
+from path import Path
+import pytest
+
+import tsrc.git
+import tsrc.gitdir
+from tsrc.test.helpers.git_server import GitServer
+
+
+def git_rev_parse(working_path: Path, *args: str) -> str:
+    _, out = tsrc.git.run_git_captured(working_path, "rev-parse", *args)
+    return out
+
+
+@pytest.fixture
+def foo_path(git_server: GitServer, tmp_path: Path) -> Path:
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "foo.txt")
+    foo_path = tmp_path.joinpath("foo")
+    tsrc.git.run_git(tmp_path, "clone", git_server.get_url("foo"), foo_path)
+    return foo_path
+
+
+def test_on_branch(foo_path: Path) -> None:
+    assert tsrc.gitdir.get_current_branch(foo_path) == "master"
+    assert tsrc.gitdir.get_head_sha1(foo_path) == git_rev_parse(foo_path, "HEAD")
+    assert tsrc.gitdir.get_tracking_ref(foo_path) == "origin/master"
+
+
+def test_detached_head(foo_path: Path) -> None:
+    tsrc.git.run_git(foo_path, "checkout", "HEAD~1")
+    assert tsrc.gitdir.get_current_branch(foo_path) == "HEAD"
+    assert tsrc.gitdir.get_head_sha1(foo_path) == git_rev_parse(foo_path, "HEAD")
+    assert tsrc.gitdir.get_tracking_ref(foo_path) is None
+
+
+def test_packed_refs(foo_path: Path) -> None:
+    tsrc.git.run_git(foo_path, "pack-refs", "--all")
+    assert not foo_path.joinpath(".git/refs/heads/master").exists()
+    assert tsrc.gitdir.get_head_sha1(foo_path) == git_rev_parse(foo_path, "HEAD")
+    assert tsrc.gitdir.get_tracking_ref(foo_path) == "origin/master"
+
+
+def test_no_upstream(foo_path: Path) -> None:
+    tsrc.git.run_git(foo_path, "checkout", "-b", "devel")
+    assert tsrc.gitdir.get_current_branch(foo_path) == "devel"
+    assert tsrc.gitdir.get_tracking_ref(foo_path) is None
+
+
+def test_upstream_gone(foo_path: Path) -> None:
+    tsrc.git.run_git(foo_path, "checkout", "-b", "devel", "--track", "origin/master")
+    tsrc.git.run_git(foo_path, "branch", "-r", "-d", "origin/master")
+    assert tsrc.gitdir.get_tracking_ref(foo_path) is None
+    assert tsrc.git.get_tracking_ref(foo_path) is None
+
+
+def test_local_upstream(foo_path: Path) -> None:
+    tsrc.git.run_git(foo_path, "checkout", "-b", "devel", "--track", "master")
+    assert tsrc.gitdir.get_tracking_ref(foo_path) == "master"
+
+
+def test_worktree(foo_path: Path, tmp_path: Path) -> None:
+    worktree_path = tmp_path.joinpath("worktree")
+    tsrc.git.run_git(foo_path, "worktree", "add", "-b", "wt", worktree_path)
+    assert tsrc.gitdir.get_current_branch(worktree_path) == "wt"
+    assert tsrc.gitdir.get_head_sha1(worktree_path) == git_rev_parse(foo_path, "HEAD")
+
+
+def test_unborn_branch_falls_back(tmp_path: Path) -> None:
+    tsrc.git.run_git(tmp_path, "init")
+    with pytest.raises(tsrc.gitdir.Unsupported):
+        tsrc.gitdir.get_current_branch(tmp_path)
+    with pytest.raises(tsrc.git.GitCommandError):
+        tsrc.git.get_current_branch(tmp_path)
+
+
+def test_not_a_repo(tmp_path: Path) -> None:
+    with pytest.raises(tsrc.gitdir.Unsupported):
+        tsrc.gitdir.get_head_sha1(tmp_path)
+
+
+def test_parse_config() -> None:
+    contents = textwrap.dedent(
+        r"""
+        # comment
+        [core]
+            bare = false ; trailing comment
+            FileMode
+        [branch "Feature/Foo"]
+            remote = origin
+            merge = "refs/heads/with \"quotes\""
+        [Remote.origin]
+            fetch = +refs/heads/*:refs/remotes/origin/*
+            fetch = +refs/tags/*:refs/tags/*
+        """
+    )
+    config = tsrc.gitdir.parse_config(contents)
+    assert config[("core", "", "bare")] == ["false"]
+    assert config[("core", "", "filemode")] == ["true"]
+    assert config[("branch", "Feature/Foo", "merge")] == ['refs/heads/with "quotes"']
+    assert len(config[("remote", "origin", "fetch")]) == 2
+
+
+def test_config_include_is_unsupported() -> None:
+    contents = textwrap.dedent(
+        """
+        [include]
+            path = other.config
+        """
+    )
+    with pytest.raises(tsrc.gitdir.Unsupported):
+        tsrc.gitdir.parse_config(contents)
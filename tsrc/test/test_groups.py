@@ -1,3 +1,5 @@
+from typing import Set
+
 import tsrc.groups
 
 import pytest
@@ -68,3 +70,76 @@ def test_unknown_group() -> None:
         group_list.get_elements(groups=["no-such-group"])
     assert e.value.parent_group is None
     assert e.value.group_name == "no-such-group"
+
+
+def test_cycle_inside_includes() -> None:
+    group_list = tsrc.groups.GroupList(elements={"a", "b", "c", "d"})
+    group_list.add("top", {"a"}, includes=["left"])
+    group_list.add("left", {"b"}, includes=["right"])
+    group_list.add("right", {"c"}, includes=["left", "bottom"])
+    group_list.add("bottom", {"d"})
+    assert group_list.get_elements(groups=["top"]) == {"a", "b", "c", "d"}
+    assert group_list.get_elements(groups=["right"]) == {"b", "c", "d"}
+    assert group_list.get_elements(groups=["bottom"]) == {"d"}
+
+
+def test_several_groups_with_common_includes() -> None:
+    group_list = tsrc.groups.GroupList(elements={"a", "b", "c"})
+    group_list.add("common", {"a"})
+    group_list.add("one", {"b"}, includes=["common"])
+    group_list.add("two", {"c"}, includes=["common"])
+    actual = group_list.get_elements(groups=["one", "one", "two"])
+    assert actual == {"a", "b", "c"}
+
+
+def test_adding_a_group_resets_closures() -> None:
+    group_list = tsrc.groups.GroupList(elements={"a", "b"})
+    group_list.add("default", {"a"})
+    assert group_list.get_elements(groups=["default"]) == {"a"}
+    group_list.add("default", {"a", "b"})
+    assert group_list.get_elements(groups=["default"]) == {"a", "b"}
+
+
+def get_expression_list() -> tsrc.groups.GroupList[str]:
+    group_list = tsrc.groups.GroupList(elements={"a", "b", "c", "d", "e"})
+    group_list.add("backend", {"a", "b", "c"})
+    group_list.add("legacy", {"b"})
+    group_list.add("android", {"d"})
+    group_list.add("ios", {"e"}, includes=["legacy"])
+    group_list.add("experimental", {"e"})
+    group_list.add("with-dashes", {"c"})
+    return group_list
+
+
+@pytest.mark.parametrize("expression,expected", [
+    ("backend & !legacy", {"a", "c"}),
+    ("(android | ios) - experimental", {"b", "d"}),
+    ("android | ios - experimental", {"b", "d"}),
+    ("backend & legacy | android", {"b", "d"}),
+    ("!(backend | ios)", {"d"}),
+    ("with-dashes", {"c"}),
+    ("backend - with-dashes - legacy", {"a"}),
+])
+def test_expressions(expression: str, expected: Set[str]) -> None:
+    group_list = get_expression_list()
+    assert group_list.get_elements(groups=[expression]) == expected
+
+
+def test_expressions_are_joined() -> None:
+    group_list = get_expression_list()
+    actual = group_list.get_elements(groups=["backend & !legacy", "android"])
+    assert actual == {"a", "c", "d"}
+
+
+@pytest.mark.parametrize("expression", ["backend &", "(backend", "backend legacy", "& backend"])
+def test_invalid_expression(expression: str) -> None:
+    group_list = get_expression_list()
+    with pytest.raises(tsrc.groups.InvalidGroupExpression):
+        group_list.get_elements(groups=[expression])
+
+
+def test_unknown_group_in_expression() -> None:
+    group_list = get_expression_list()
+    with pytest.raises(tsrc.groups.GroupNotFound) as e:
+        group_list.get_elements(groups=["backend - no-such-group"])
+    assert e.value.group_name == "no-such-group"
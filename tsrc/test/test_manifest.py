@@ -3,6 +3,7 @@ import os.path
 
 import ruamel.yaml
 
+import tsrc.config
 import tsrc.manifest
 from path import Path
 
@@ -79,6 +80,8 @@ repos:
     manifest.load(parsed)
     assert manifest.get_url("foo") == "git@example.com:proj_one/foo"
     assert manifest.get_url("bar") == "git@example.com:proj_two/bar"
+    assert manifest.get_repos_by_url("git@example.com:proj_one/foo") == [manifest.get_repo("foo")]
+    assert manifest.get_repos_by_url("git@example.com:no/such") == []
     with pytest.raises(tsrc.manifest.RepoNotFound) as e:
         manifest.get_url("no/such")
         assert "no/such" in e.value.message
@@ -184,3 +187,30 @@ groups:
     repos_getter.contents = contents
     assert repos_getter.get_repos(all_=False) == ["one"]
     assert repos_getter.get_repos(all_=True) == ["one", "two"]
+
+
+def test_cache(tmp_path: Path) -> None:
+    manifest_path = tmp_path.joinpath("manifest.yml")
+    cache_dir = tmp_path.joinpath("cache")
+    manifest_path.write_text("repos:\n  - { src: one, url: one.com }\n")
+    tsrc.manifest.load(manifest_path, cache_dir=cache_dir)
+    assert cache_dir.joinpath("manifest.pickle").exists()
+
+    num_parses = tsrc.config.NUM_PARSES
+    manifest = tsrc.manifest.load(manifest_path, cache_dir=cache_dir)
+    assert tsrc.config.NUM_PARSES == num_parses
+    assert manifest.get_url("one") == "one.com"
+
+    manifest_path.write_text("repos:\n  - { src: one, url: two.com }\n")
+    manifest = tsrc.manifest.load(manifest_path, cache_dir=cache_dir)
+    assert tsrc.config.NUM_PARSES == num_parses + 1
+    assert manifest.get_url("one") == "two.com"
+
+
+def test_corrupted_cache(tmp_path: Path) -> None:
+    manifest_path = tmp_path.joinpath("manifest.yml")
+    cache_dir = tmp_path.joinpath("cache").mkdir()
+    cache_dir.joinpath("manifest.pickle").write_text("garbage")
+    manifest_path.write_text("repos:\n  - { src: one, url: one.com }\n")
+    manifest = tsrc.manifest.load(manifest_path, cache_dir=cache_dir)
+    assert manifest.get_url("one") == "one.com"
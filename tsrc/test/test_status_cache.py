@@ -0,0 +1,96 @@
+from typing import Any, List  # noqa
+
+from path import Path
+import pytest
+
+import tsrc.git
+import tsrc.status_cache
+from tsrc.status_cache import StatusCache
+
+
+@pytest.fixture
+def repo_path(tmp_path: Path) -> Path:
+    res = tmp_path.joinpath("foo")
+    res.makedirs_p()
+    tsrc.git.run_git(res, "init")
+    res.joinpath("README").write_text("foo\n")
+    tsrc.git.run_git(res, "add", "README")
+    tsrc.git.run_git(res, "commit", "--message", "initial commit")
+    return res
+
+
+@pytest.fixture
+def tag_calls(monkeypatch: Any) -> List[Path]:
+    """ Record the calls to `git tag --points-at`, and disable the
+    protection against racy signatures, since the test repos were
+    just created
+
+    """
+    res = list()  # type: List[Path]
+    get_current_tag = tsrc.git.get_current_tag
+
+    def spy(working_path: Path) -> str:
+        res.append(working_path)
+        return get_current_tag(working_path)
+
+    monkeypatch.setattr(tsrc.git, "get_current_tag", spy)
+    monkeypatch.setattr(tsrc.status_cache, "RACY_DELAY_NS", 0)
+    return res
+
+
+def test_tag_is_cached(tmp_path: Path, repo_path: Path, tag_calls: List[Path]) -> None:
+    tsrc.git.run_git(repo_path, "tag", "v1.0")
+    cache_path = tmp_path.joinpath("status-cache")
+    cache = StatusCache(cache_path)
+    assert cache.get_tag("foo", repo_path) == "v1.0"
+    cache.save()
+
+    cache = StatusCache(cache_path)
+    cache.load()
+    assert cache.get_tag("foo", repo_path) == "v1.0"
+    assert len(tag_calls) == 1
+
+
+def test_new_tag_invalidates_cache(repo_path: Path, tag_calls: List[Path]) -> None:
+    cache = StatusCache(Path("unused"))
+    assert not cache.get_tag("foo", repo_path)
+    tsrc.git.run_git(repo_path, "tag", "v1.0")
+    assert cache.get_tag("foo", repo_path) == "v1.0"
+    tsrc.git.run_git(repo_path, "tag", "--delete", "v1.0")
+    assert not cache.get_tag("foo", repo_path)
+    assert len(tag_calls) == 3
+
+
+def test_new_commit_invalidates_cache(repo_path: Path, tag_calls: List[Path]) -> None:
+    tsrc.git.run_git(repo_path, "tag", "v1.0")
+    cache = StatusCache(Path("unused"))
+    assert cache.get_tag("foo", repo_path) == "v1.0"
+    tsrc.git.run_git(repo_path, "commit", "--allow-empty", "--message", "second commit")
+    assert not cache.get_tag("foo", repo_path)
+
+
+def test_packed_tags(repo_path: Path, tag_calls: List[Path]) -> None:
+    cache = StatusCache(Path("unused"))
+    tsrc.git.run_git(repo_path, "tag", "v1.0")
+    tsrc.git.run_git(repo_path, "pack-refs", "--all")
+    assert cache.get_tag("foo", repo_path) == "v1.0"
+    tsrc.git.run_git(repo_path, "tag", "--delete", "v1.0")
+    assert not cache.get_tag("foo", repo_path)
+
+
+def test_recent_changes_are_not_cached(repo_path: Path, tag_calls: List[Path],
+                                       monkeypatch: Any) -> None:
+    monkeypatch.setattr(tsrc.status_cache, "RACY_DELAY_NS", 10 ** 12)
+    tsrc.git.run_git(repo_path, "tag", "v1.0")
+    cache = StatusCache(Path("unused"))
+    cache.get_tag("foo", repo_path)
+    cache.get_tag("foo", repo_path)
+    assert len(tag_calls) == 2
+
+
+def test_corrupted_cache_is_ignored(tmp_path: Path, repo_path: Path) -> None:
+    cache_path = tmp_path.joinpath("status-cache")
+    cache_path.write_text("{not json")
+    cache = StatusCache(cache_path)
+    cache.load()
+    assert not cache.get_tag("foo", repo_path)
@@ -96,3 +96,17 @@ def test_git_server_default_branch_devel(workspace_path: Path, git_server: GitSe
     manifest = read_remote_manifest(workspace_path, git_server)
     foo_config = manifest.get_repo("foo")
     assert foo_config.branch == "devel"
+
+
+def test_git_server_add_repos(workspace_path: Path, git_server: GitServer) -> None:
+    git_server.add_repos(["foo", "spam/eggs"])
+    git_server.push_file("spam/eggs", "eggs.txt", contents="this is eggs\n")
+
+    manifest = read_remote_manifest(workspace_path, git_server)
+    assert [repo.src for repo in manifest.get_repos()] == ["foo", "spam/eggs"]
+    tsrc.git.run_git(workspace_path, "clone", git_server.get_url("spam/eggs"))
+    assert workspace_path.joinpath("eggs", "eggs.txt").text() == "this is eggs\n"
+    # Repos copied from the template must not share their remotes
+    foo_bare_path = git_server.bare_path.joinpath("foo")
+    _, out = tsrc.git.run_git_captured(foo_bare_path, "log", "--format=%s", "master")
+    assert out == "Initial commit"
@@ -0,0 +1,57 @@
+from typing import Iterator
+
+from path import Path
+import pytest
+
+import tsrc.git
+import tsrc.timings
+
+
+@pytest.fixture
+def timings() -> Iterator[None]:
+    tsrc.timings.enable()
+    yield
+    tsrc.timings.disable()
+
+
+def test_stats_per_item(timings: None, tmp_path: Path) -> None:
+    with tsrc.timings.item("Frobnicating", "foo"):
+        tsrc.git.run_git(tmp_path, "init", "foo")
+        tsrc.git.run_git_captured(tmp_path.joinpath("foo"), "status")
+    tsrc.git.run_git_captured(tmp_path.joinpath("foo"), "status")
+
+    foo_stats, other_stats = tsrc.timings.get_stats()
+    assert foo_stats.phase == "Frobnicating"
+    assert foo_stats.item == "foo"
+    assert foo_stats.num_git_calls == 2
+    assert foo_stats.wall_time > 0
+    assert other_stats.num_git_calls == 1
+
+
+def test_bytes_fetched(timings: None, tmp_path: Path) -> None:
+    src_path = tmp_path.joinpath("src")
+    src_path.mkdir()
+    tsrc.git.run_git(src_path, "init")
+    src_path.joinpath("README").write_text("This is src\n" * 100)
+    tsrc.git.run_git(src_path, "add", "README")
+    tsrc.git.run_git(src_path, "commit", "--message", "initial commit")
+
+    with tsrc.timings.item("Cloning", "src"):
+        tsrc.git.run_git(tmp_path, "clone", "--no-local", src_path, "dest")
+
+    clone_stats, _ = tsrc.timings.get_stats()
+    assert clone_stats.bytes_fetched > 0
+
+
+def test_disabled(tmp_path: Path) -> None:
+    tsrc.timings.enable()
+    tsrc.timings.disable()
+    with tsrc.timings.item("Frobnicating", "foo"):
+        tsrc.git.run_git(tmp_path, "init", "foo")
+    assert len(tsrc.timings.get_stats()) == 1
+
+
+def test_human_size() -> None:
+    assert tsrc.timings.human_size(12) == "12 B"
+    assert tsrc.timings.human_size(2048) == "2.0 KiB"
+    assert tsrc.timings.human_size(3 * 1024 ** 3) == "3.0 GiB"
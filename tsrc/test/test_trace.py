@@ -0,0 +1,45 @@
+import json
+
+from path import Path
+
+import tsrc.git
+import tsrc.trace
+
+
+def test_trace_git_calls(tmp_path: Path) -> None:
+    trace_path = tmp_path.joinpath("trace.json")
+    tsrc.trace.start()
+    with tsrc.trace.span("foo", "item"):
+        tsrc.git.run_git(tmp_path, "init", "foo")
+        tsrc.git.run_git_captured(tmp_path, "status", check=False)
+    tsrc.trace.stop(trace_path)
+
+    events = json.loads(trace_path.text())["traceEvents"]
+    spans = [e for e in events if e["ph"] == "X"]
+    assert [e["name"] for e in spans] == ["git init", "git status", "foo"]
+    init_span, status_span, item_span = spans
+    assert init_span["args"]["argv"] == ["git", "init", "foo"]
+    assert init_span["args"]["cwd"] == tmp_path
+    assert init_span["args"]["returncode"] == 0
+    assert status_span["args"]["returncode"] != 0
+    assert item_span["ts"] <= init_span["ts"]
+    assert item_span["dur"] >= init_span["dur"] + status_span["dur"]
+
+
+def test_trace_as_json_lines(tmp_path: Path) -> None:
+    trace_path = tmp_path.joinpath("trace.jsonl")
+    tsrc.trace.start()
+    with tsrc.trace.span("foo", "item"):
+        pass
+    tsrc.trace.stop(trace_path)
+
+    events = [json.loads(line) for line in trace_path.lines()]
+    assert events[0]["ph"] == "M"
+    assert events[1]["name"] == "foo"
+
+
+def test_no_trace_by_default(tmp_path: Path) -> None:
+    with tsrc.trace.span("foo", "item") as span_args:
+        span_args["bar"] = 42
+    tsrc.trace.stop(tmp_path.joinpath("trace.json"))
+    assert not tmp_path.joinpath("trace.json").exists()
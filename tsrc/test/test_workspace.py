@@ -0,0 +1,36 @@
+import os
+
+from path import Path
+
+import tsrc.config
+import tsrc.workspace
+from tsrc.workspace import Workspace
+
+
+def test_config_is_parsed_once(workspace: Workspace, workspace_path: Path) -> None:
+    workspace_path.joinpath(".tsrc").mkdir()
+    local_manifest = workspace.local_manifest
+    options = tsrc.workspace.Options(url="git@example.com:manifest.git", shallow=True)
+    local_manifest.save_config(options)
+
+    num_parses = tsrc.config.NUM_PARSES
+    assert local_manifest.shallow
+    assert local_manifest.branch == "master"
+    assert local_manifest.active_groups == list()
+    assert tsrc.config.NUM_PARSES == num_parses + 1
+
+
+def test_config_is_reparsed_when_changed(workspace: Workspace, workspace_path: Path) -> None:
+    workspace_path.joinpath(".tsrc").mkdir()
+    local_manifest = workspace.local_manifest
+    options = tsrc.workspace.Options(url="git@example.com:manifest.git")
+    local_manifest.save_config(options)
+    assert local_manifest.branch == "master"
+
+    cfg_path = local_manifest.cfg_path
+    cfg_path.write_text(cfg_path.text().replace("master", "devel"))
+    # Make sure the mtime changes, even on file systems with a coarse resolution
+    stat_result = cfg_path.stat()
+    os.utime(cfg_path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 10 ** 9))
+
+    assert local_manifest.branch == "devel"
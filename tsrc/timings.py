@@ -0,0 +1,186 @@
+""" Per-item timings, reported at the end of the command with `tsrc --timings`
+
+For each item processed by the executor, record the wall time, the
+number of git processes spawned and the number of bytes fetched.
+
+Bytes fetched are measured by looking at the size of the pack files
+before and after `git fetch` and `git clone`, so objects fetched
+as loose objects are not counted.
+
+"""
+
+import contextlib
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence  # noqa
+
+from path import Path
+import ui
+
+ENABLED = False
+NUM_SLOWEST = 10
+
+
+class ItemStats:
+    def __init__(self, phase: str, item: str) -> None:
+        self.phase = phase
+        self.item = item
+        self.wall_time = 0.0
+        self.num_git_calls = 0
+        self.bytes_fetched = 0
+
+
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+# Stats of git calls made outside of any executor item
+_OTHER = ItemStats("(other)", "")
+_STATS = list()  # type: List[ItemStats]
+
+
+def enable() -> None:
+    global ENABLED, _OTHER, _STATS
+    ENABLED = True
+    _OTHER = ItemStats("(other)", "")
+    _STATS = list()
+
+
+def disable() -> None:
+    global ENABLED
+    ENABLED = False
+
+
+def get_stats() -> List[ItemStats]:
+    return _STATS + [_OTHER]
+
+
+def _current() -> ItemStats:
+    res = getattr(_LOCAL, "current", None)  # type: Optional[ItemStats]
+    return res or _OTHER
+
+
+@contextlib.contextmanager
+def item(phase: str, name: str) -> Iterator[None]:
+    """ Record the stats of one item of the given phase """
+    if not ENABLED:
+        yield
+        return
+    stats = ItemStats(phase, name)
+    _LOCAL.current = stats
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.wall_time = time.perf_counter() - start
+        _LOCAL.current = None
+        with _LOCK:
+            _STATS.append(stats)
+
+
+def count_git_call() -> None:
+    """ Record a git call made from the current thread """
+    if not ENABLED:
+        return
+    stats = _current()
+    with _LOCK:
+        stats.num_git_calls += 1
+
+
+@contextlib.contextmanager
+def git_call(working_path: Path, cmd: Sequence[str]) -> Iterator[None]:
+    """ Record a git call made from the current thread, along with
+    the bytes it fetched, if any
+
+    """
+    if not ENABLED:
+        yield
+        return
+    count_git_call()
+    stats = _current()
+    pack_path = get_pack_path(working_path, cmd)
+    if not pack_path:
+        yield
+        return
+    size_before = get_pack_size(pack_path)
+    try:
+        yield
+    finally:
+        size_after = get_pack_size(pack_path)
+        with _LOCK:
+            stats.bytes_fetched += max(size_after - size_before, 0)
+
+
+def get_pack_path(working_path: Path, cmd: Sequence[str]) -> Optional[Path]:
+    """ Return the path of the directory where the packs fetched by
+    `cmd` will be written, or None if `cmd` does not fetch anything
+
+    """
+    if not cmd:
+        return None
+    if cmd[0] == "fetch":
+        repo_path = working_path
+        bare = not repo_path.joinpath(".git").exists()
+    elif cmd[0] == "clone":
+        repo_path = working_path.joinpath(cmd[-1])
+        bare = "--mirror" in cmd or "--bare" in cmd
+    else:
+        return None
+    if bare:
+        # Like the repos in the mirror cache
+        return repo_path.joinpath("objects", "pack")
+    return repo_path.joinpath(".git", "objects", "pack")
+
+
+def get_pack_size(pack_path: Path) -> int:
+    if not pack_path.isdir():
+        return 0
+    return sum(pack_file.size for pack_file in pack_path.files("*.pack"))
+
+
+def human_size(num_bytes: int) -> str:
+    if num_bytes < 1024:
+        return "%d B" % num_bytes
+    size = num_bytes / 1024
+    for unit in ("KiB", "MiB"):
+        if size < 1024:
+            return "%.1f %s" % (size, unit)
+        size /= 1024
+    return "%.1f GiB" % size
+
+
+def report(num_slowest: int = NUM_SLOWEST) -> None:
+    """ Display the slowest items, then the totals for each phase """
+    stats = get_stats()
+    items = [s for s in stats if s is not _OTHER]
+    slowest = sorted(items, key=lambda s: s.wall_time, reverse=True)[:num_slowest]
+    headers = ("phase", "item", "time", "git calls", "fetched")
+    if slowest:
+        ui.info_1("Slowest items")
+        data = [
+            (
+                (ui.reset, s.phase), (ui.bold, s.item), (ui.reset, "%.2fs" % s.wall_time),
+                (ui.reset, str(s.num_git_calls)), (ui.reset, human_size(s.bytes_fetched)),
+            )
+            for s in slowest
+        ]
+        ui.info_table(data, headers=headers)
+
+    totals = dict()  # type: Dict[str, ItemStats]
+    for s in stats:
+        total = totals.setdefault(s.phase, ItemStats(s.phase, ""))
+        total.wall_time += s.wall_time
+        total.num_git_calls += s.num_git_calls
+        total.bytes_fetched += s.bytes_fetched
+    ui.info_1("Totals per phase")
+    # With -j, the time of the items of a phase add up to
+    # more than the time the phase took
+    headers = ("phase", "items", "cumulated time", "git calls", "fetched")
+    data = [
+        (
+            (ui.bold, phase),
+            (ui.reset, str(len([s for s in items if s.phase == phase]))),
+            (ui.reset, "%.2fs" % total.wall_time),
+            (ui.reset, str(total.num_git_calls)), (ui.reset, human_size(total.bytes_fetched)),
+        )
+        for phase, total in totals.items()
+    ]
+    ui.info_table(data, headers=headers)
@@ -0,0 +1,105 @@
+""" Record spans of activity, written to a file with `tsrc --trace FILE`
+
+The file uses the Chrome trace-event format, and can be loaded in
+chrome://tracing or https://ui.perfetto.dev. If FILE ends with
+`.jsonl`, one event per line is written instead.
+
+Spans cover the command, each phase (one for each run of the executor),
+each item processed by the executor, and each git call.
+
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional  # noqa
+
+from path import Path
+
+Event = Dict[str, Any]
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.events = list()  # type: List[Event]
+        self.start_time = time.perf_counter()
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._thread_ids = dict()  # type: Dict[int, int]
+
+    def get_tid(self) -> int:
+        """ Number threads from 1, in the order they were seen,
+        so that they are easier to tell apart in the viewer
+
+        Must be called with the lock held.
+        """
+        ident = threading.get_ident()
+        res = self._thread_ids.get(ident)
+        if res is None:
+            res = len(self._thread_ids) + 1
+            self._thread_ids[ident] = res
+            self.events.append({
+                "name": "thread_name", "ph": "M", "pid": self.pid, "tid": res,
+                "args": {"name": threading.current_thread().name},
+            })
+        return res
+
+    def get_timestamp(self) -> float:
+        """ Microseconds since the tracer was created """
+        return (time.perf_counter() - self.start_time) * 1e6
+
+    def add_span(self, name: str, category: str, start: float, args: Dict[str, Any]) -> None:
+        end = self.get_timestamp()
+        with self._lock:
+            self.events.append({
+                "name": name, "cat": category, "ph": "X",
+                "ts": round(start, 3), "dur": round(end - start, 3),
+                "pid": self.pid, "tid": self.get_tid(), "args": args,
+            })
+
+    def write(self, output_path: Path) -> None:
+        with self._lock:
+            events = list(self.events)
+        with open(output_path, "w") as fp:
+            if output_path.endswith(".jsonl"):
+                for event in events:
+                    fp.write(json.dumps(event) + "\n")
+            else:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fp)
+
+
+_TRACER = None  # type: Optional[Tracer]
+
+
+def start() -> None:
+    global _TRACER
+    _TRACER = Tracer()
+
+
+def stop(output_path: Path) -> None:
+    global _TRACER
+    if _TRACER is None:
+        return
+    tracer = _TRACER
+    _TRACER = None
+    tracer.write(output_path)
+
+
+@contextlib.contextmanager
+def span(name: str, category: str, **args: Any) -> Iterator[Dict[str, Any]]:
+    """ Record a span around the body of the `with` statement
+
+    Yield the args of the span, so that the caller can add the
+    values it only knows at the end, like a return code.
+    """
+    tracer = _TRACER
+    if tracer is None:
+        yield args
+        return
+    start_ts = tracer.get_timestamp()
+    try:
+        yield args
+    finally:
+        tracer.add_span(name, category, start_ts, args)
@@ -7,6 +7,7 @@ Mostly used by tsrc/cli.py
 import argparse
 import stat
 import textwrap
+import threading
 from typing import cast, Iterable, List, Tuple, Dict, Any, Optional, NewType  # noqa
 
 import attr
@@ -18,7 +19,9 @@ import ui
 import tsrc
 import tsrc.executor
 import tsrc.git
+import tsrc.journal
 import tsrc.manifest
+import tsrc.mirror
 
 
 OPTIONS_SCHEMA = schema.Schema({
@@ -27,6 +30,8 @@ OPTIONS_SCHEMA = schema.Schema({
     schema.Optional("tag"): str,
     schema.Optional("groups"): [str],
     schema.Optional("shallow"): bool,
+    schema.Optional("clone_filter"): str,
+    schema.Optional("bundles"): str,
 })
 
 
@@ -37,6 +42,8 @@ class Options:
     tag = attr.ib(default=None)  # type: Optional[str]
     shallow = attr.ib(default=False)  # type: bool
     groups = attr.ib(default=list())  # type: List[str]
+    clone_filter = attr.ib(default=None)  # type: Optional[str]
+    bundles = attr.ib(default=None)  # type: Optional[str]
 
 
 def options_from_dict(as_dict: dict) -> Options:
@@ -46,6 +53,8 @@ def options_from_dict(as_dict: dict) -> Options:
     res.tag = as_dict.get("tag")
     res.shallow = as_dict.get("shallow", False)
     res.groups = as_dict.get("groups") or list()
+    res.clone_filter = as_dict.get("clone_filter")
+    res.bundles = as_dict.get("bundles")
     return res
 
 
@@ -68,7 +77,11 @@ class LocalManifest:
         hidden_path = workspace_path.joinpath(".tsrc")
         self.clone_path = hidden_path.joinpath("manifest")
         self.cfg_path = hidden_path.joinpath("manifest.yml")
+        self.cache_path = hidden_path.joinpath("cache")
         self.manifest = None  # type: Optional[tsrc.manifest.Manifest]
+        self._config = None  # type: Optional[Options]
+        self._config_signature = None  # type: Optional[Tuple[int, int]]
+        self._config_lock = threading.Lock()
 
     @property
     def branch(self) -> str:
@@ -78,6 +91,14 @@ class LocalManifest:
     def shallow(self) -> bool:
         return self.load_config().shallow
 
+    @property
+    def clone_filter(self) -> Optional[str]:
+        return self.load_config().clone_filter
+
+    @property
+    def bundles(self) -> Optional[str]:
+        return self.load_config().bundles
+
     @property
     def copyfiles(self) -> List[Tuple[str, str]]:
         assert self.manifest, "manifest is empty. Did you call load()?"
@@ -96,7 +117,7 @@ class LocalManifest:
         if not yml_path.exists():
             message = "No manifest found in {}. Did you run `tsrc init` ?"
             raise tsrc.Error(message.format(yml_path))
-        self.manifest = tsrc.manifest.load(yml_path)
+        self.manifest = tsrc.manifest.load(yml_path, cache_dir=self.cache_path)
 
     def get_gitlab_url(self) -> str:
         assert self.manifest, "manifest is empty. Did you call load()?"
@@ -135,11 +156,31 @@ class LocalManifest:
         if options.groups:
             config["groups"] = options.groups
         config["shallow"] = options.shallow
+        if options.clone_filter:
+            config["clone_filter"] = options.clone_filter
+        if options.bundles:
+            config["bundles"] = options.bundles
         with self.cfg_path.open("w") as fp:
             ruamel.yaml.dump(config, fp)
+        with self._config_lock:
+            self._config = None
 
     def load_config(self) -> Options:
-        return options_from_file(self.cfg_path)
+        """ Return the workspace options, parsing the config file
+        only if it changed since the last call
+
+        """
+        with self._config_lock:
+            try:
+                stat_result = self.cfg_path.stat()
+            except OSError:
+                # Let options_from_file() raise InvalidConfig
+                return options_from_file(self.cfg_path)
+            signature = (stat_result.st_mtime_ns, stat_result.st_size)
+            if self._config is None or signature != self._config_signature:
+                self._config = options_from_file(self.cfg_path)
+                self._config_signature = signature
+            return self._config
 
     def _ensure_git_state(self, options: Options) -> None:
         if self.clone_path.exists():
@@ -177,9 +218,12 @@ class LocalManifest:
 
 
 class Workspace():
-    def __init__(self, root_path: Path) -> None:
+    def __init__(self, root_path: Path, num_jobs: int = 1) -> None:
         self.root_path = root_path
+        self.num_jobs = num_jobs
         self.local_manifest = LocalManifest(root_path)
+        # Set by `tsrc sync` so that interrupted runs can be resumed
+        self.journal = None  # type: Optional[tsrc.journal.Journal]
 
     def joinpath(self, *parts: str) -> Path:
         return self.root_path.joinpath(*parts)
@@ -207,6 +251,17 @@ class Workspace():
     def shallow(self) -> bool:
         return self.local_manifest.shallow
 
+    @property
+    def clone_filter(self) -> Optional[str]:
+        return self.local_manifest.clone_filter
+
+    @property
+    def bundles_path(self) -> Optional[Path]:
+        bundles = self.local_manifest.bundles
+        if not bundles:
+            return None
+        return self.joinpath(bundles)
+
     def clone_missing(self) -> None:
         """ Clone missing repos.
 
@@ -219,20 +274,28 @@ class Workspace():
             if not repo_path.exists():
                 to_clone.append(repo)
         cloner = Cloner(self)
-        tsrc.executor.run_sequence(to_clone, cloner)
+        # A repo nested in another one must be cloned once its parent is
+        # there: otherwise the parent directory would be created first,
+        # and `git clone` of the parent would fail
+        for wave in get_clone_waves(to_clone):
+            tsrc.executor.run_sequence(wave, cloner, num_jobs=self.num_jobs,
+                                       journal=self.journal)
 
     def set_remotes(self) -> None:
         remote_setter = RemoteSetter(self)
-        tsrc.executor.run_sequence(self.get_repos(), remote_setter)
+        tsrc.executor.run_sequence(self.get_repos(), remote_setter,
+                                   num_jobs=self.num_jobs, journal=self.journal)
 
     def copy_files(self) -> None:
         file_copier = FileCopier(self)
-        tsrc.executor.run_sequence(self.local_manifest.copyfiles, file_copier)
+        tsrc.executor.run_sequence(self.local_manifest.copyfiles, file_copier,
+                                   num_jobs=self.num_jobs, journal=self.journal)
 
     def sync(self) -> None:
         syncer = Syncer(self)
         try:
-            tsrc.executor.run_sequence(self.get_repos(), syncer)
+            tsrc.executor.run_sequence(self.get_repos(), syncer, num_jobs=self.num_jobs,
+                                       journal=self.journal)
         finally:
             syncer.display_bad_branches()
 
@@ -247,9 +310,44 @@ class Workspace():
         return self.local_manifest.get_url(src)
 
 
+def get_clone_waves(repos: List[tsrc.Repo]) -> List[List[tsrc.Repo]]:
+    """ Split `repos` so that each repo comes after the repos whose
+    src contains it, keeping the order of the manifest in each wave
+
+    """
+    srcs = [repo.src.rstrip("/") + "/" for repo in repos]
+    waves = list()  # type: List[List[tsrc.Repo]]
+    for repo, src in zip(repos, srcs):
+        depth = sum(1 for other in srcs if other != src and src.startswith(other))
+        while len(waves) <= depth:
+            waves.append(list())
+        waves[depth].append(repo)
+    return [wave for wave in waves if wave]
+
+
+def apply_sparse_checkout(repo: tsrc.Repo, repo_path: Path) -> None:
+    """ Restrict the checkout to the directories listed in the
+    `sparse` field of the repo in the manifest, if any, or restore
+    the full checkout when the field was removed
+
+    """
+    if not repo.sparse:
+        if tsrc.git.is_sparse_checkout(repo_path):
+            try:
+                tsrc.git.run_git(repo_path, "sparse-checkout", "disable")
+            except tsrc.Error:
+                raise tsrc.Error("Disabling sparse checkout failed")
+        return
+    try:
+        tsrc.git.run_git(repo_path, "sparse-checkout", "set", "--cone", *repo.sparse)
+    except tsrc.Error:
+        raise tsrc.Error("Setting sparse checkout failed")
+
+
 class Cloner(tsrc.executor.Task[tsrc.Repo]):
     def __init__(self, workspace: Workspace) -> None:
         self.workspace = workspace
+        self.mirror_cache = tsrc.mirror.from_tsrc_config()
 
     def description(self) -> str:
         return "Cloning missing repos"
@@ -268,25 +366,81 @@ class Cloner(tsrc.executor.Task[tsrc.Repo]):
             message = message.format(repo=repo)
             ui.fatal(message)
 
-    def clone_repo(self, repo: tsrc.Repo) -> None:
+    def get_bundle_path(self, repo: tsrc.Repo) -> Optional[Path]:
+        if repo.bundle:
+            return self.workspace.joinpath(repo.bundle)
+        bundles_path = self.workspace.bundles_path
+        if not bundles_path:
+            return None
+        bundle_path = bundles_path.joinpath(repo.src + ".bundle")
+        if not bundle_path.exists():
+            return None
+        return bundle_path
+
+    @staticmethod
+    def get_clone_ref(repo: tsrc.Repo) -> Optional[str]:
+        if repo.tag:
+            return repo.tag
+        return repo.branch
+
+    def clone_from_bundle(self, repo: tsrc.Repo, bundle_path: Path) -> None:
+        """ Clone from a local bundle file, then fetch what is missing
+        from the real remote
+
+        """
         repo_path = self.workspace.joinpath(repo.src)
         parent, name = repo_path.splitpath()
         parent.makedirs_p()
-        clone_args = ["clone", repo.url]
-        ref = None
-        if repo.tag:
-            ref = repo.tag
-        elif repo.branch:
-            ref = repo.branch
+        clone_args = ["clone", bundle_path]
+        if repo.sparse:
+            clone_args.append("--sparse")
+        ref = self.get_clone_ref(repo)
         if ref:
             clone_args.extend(["--branch", ref])
-        if self.workspace.shallow:
-            clone_args.extend(["--depth", "1"])
+        clone_args.append(name)
+        tsrc.git.run_git(parent, *clone_args)
+        apply_sparse_checkout(repo, repo_path)
+        RemoteSetter(self.workspace).process(repo)
+        tsrc.git.run_git(repo_path, "fetch", "--tags", "--prune", "origin")
+        if not repo.tag:
+            tsrc.git.run_git(repo_path, "merge", "--ff-only", "@{u}")
+
+    def clone_repo(self, repo: tsrc.Repo) -> None:
+        repo_path = self.workspace.joinpath(repo.src)
+        bundle_path = self.get_bundle_path(repo)
+        if bundle_path:
+            try:
+                self.clone_from_bundle(repo, bundle_path)
+                return
+            except tsrc.Error as error:
+                ui.warning("Could not clone from", bundle_path, "-", error)
+                repo_path.rmtree_p()
+        parent, name = repo_path.splitpath()
+        parent.makedirs_p()
+        clone_args = self.get_clone_args(repo)
         clone_args.append(name)
         try:
             tsrc.git.run_git(parent, *clone_args)
         except tsrc.Error:
             raise tsrc.Error("Cloning failed")
+        apply_sparse_checkout(repo, repo_path)
+
+    def get_clone_args(self, repo: tsrc.Repo) -> List[str]:
+        res = ["clone", repo.url]
+        ref = self.get_clone_ref(repo)
+        if ref:
+            res.extend(["--branch", ref])
+        if self.workspace.shallow:
+            res.extend(["--depth", "1"])
+        clone_filter = repo.clone_filter or self.workspace.clone_filter
+        if clone_filter:
+            res.append("--filter=%s" % clone_filter)
+        if self.mirror_cache:
+            res.extend(self.mirror_cache.get_clone_args(repo.url))
+        if repo.sparse:
+            # Only check out the files at the top of the repo for now
+            res.append("--sparse")
+        return res
 
     def reset_repo(self, repo: tsrc.Repo) -> None:
         repo_path = self.workspace.joinpath(repo.src)
@@ -384,6 +538,7 @@ class BadBranches(tsrc.Error):
 class Syncer(tsrc.executor.Task[tsrc.Repo]):
     def __init__(self, workspace: Workspace) -> None:
         self.workspace = workspace
+        self.mirror_cache = tsrc.mirror.from_tsrc_config()
         self.bad_branches = list()  # type: List[Tuple[str, str, str]]
 
     def description(self) -> str:
@@ -395,7 +550,13 @@ class Syncer(tsrc.executor.Task[tsrc.Repo]):
     def process(self, repo: tsrc.Repo) -> None:
         ui.info(repo.src)
         repo_path = self.workspace.joinpath(repo.src)
-        self.fetch(repo_path)
+        if tsrc.git.needs_fetch(repo_path):
+            if self.mirror_cache:
+                self.mirror_cache.refresh(repo.url)
+            self.fetch(repo_path)
+        else:
+            ui.info_2("Remote refs did not change, skipping fetch")
+        apply_sparse_checkout(repo, repo_path)
         ref = None
 
         if repo.tag:
@@ -440,6 +601,8 @@ class Syncer(tsrc.executor.Task[tsrc.Repo]):
 
     @staticmethod
     def sync_repo_to_branch(repo_path: Path) -> None:
+        if tsrc.git.head_is_upstream(repo_path):
+            return
         try:
             tsrc.git.run_git(repo_path, "merge", "--ff-only", "@{u}")
         except tsrc.Error:
@@ -450,9 +613,12 @@ class Syncer(tsrc.executor.Task[tsrc.Repo]):
             return
         ui.error("Some projects were not on the correct branch")
         headers = ("project", "actual", "expected")
+        # With -j, the repos are not processed in the order of the manifest
+        order = {repo.src: i for i, repo in enumerate(self.workspace.get_repos())}
+        bad_branches = sorted(self.bad_branches, key=lambda x: order.get(x[0], len(order)))
         data = [
             ((ui.bold, name), (ui.red, actual), (ui.green, expected)) for
-            (name, actual, expected) in self.bad_branches
+            (name, actual, expected) in bad_branches
         ]
         ui.info_table(data, headers=headers)
         raise BadBranches()